@@ -0,0 +1,272 @@
+"""
+Server-side Citi Bike GBFS proxy.
+
+station_information (names, coordinates, capacity) rarely changes, so it is
+joined once into per-station rows and a coarse lat/lon grid. Each
+station_status refresh only overlays the few numbers that change
+(bikes, e-bikes, docks) and records which stations moved in a bounded
+changelog. That lets the proxy answer:
+- a full merged payload (cached once per version, plain and gzipped)
+- `since=<version>` deltas holding only the stations that changed since then
+- either of the above restricted to a `bbox=minLon,minLat,maxLon,maxLat`
+
+Versions are the feed's `last_updated` timestamps (bumped by one if the feed
+repeats itself with new data), so they stay meaningful across restarts and
+across pre-fork workers that load the poller's exported state.
+"""
+import gzip
+import json
+import math
+import threading
+import time
+from collections import deque
+
+GRID_CELL_DEGREES = 0.01   # ~1 km cells at NYC's latitude
+CHANGELOG_VERSIONS = 120   # status refreshes a `since=` delta can reach back over
+INFO_REFRESH_SECONDS = 3600
+MIN_REFRESH_SECONDS = 10   # floor under the feed's ttl
+FIELDS = ["id", "name", "lat", "lon", "capacity", "bikes", "ebikes", "docks"]
+DELTA_FIELDS = ["id", "bikes", "ebikes", "docks"]
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _cell(lat, lon):
+    return (int(lat // GRID_CELL_DEGREES), int(lon // GRID_CELL_DEGREES))
+
+
+def parse_bbox(value):
+    """Parses 'minLon,minLat,maxLon,maxLat'. Returns a tuple or None if malformed."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(','))
+    except (AttributeError, ValueError):
+        return None
+    # nan/inf would only fail later, in the grid lookup
+    if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+        return None
+    if min_lon > max_lon or min_lat > max_lat:
+        return None
+    return (min_lon, min_lat, max_lon, max_lat)
+
+
+class GbfsProxy:
+    def __init__(self, base_url, min_refresh_seconds=MIN_REFRESH_SECONDS):
+        self.base_url = base_url.rstrip('/')
+        self.min_refresh_seconds = min_refresh_seconds
+        self.lock = threading.Lock()
+
+        self.static = []    # idx -> [id, name, lat, lon, capacity]
+        self.status = []    # idx -> [bikes, ebikes, docks]
+        self.index = {}     # station_id -> idx
+        self.grid = {}      # (lat cell, lon cell) -> [idx]
+        self.changelog = deque(maxlen=CHANGELOG_VERSIONS)  # (version, [idx])
+        self.changelog_floor = 0  # every change after this version is in the changelog
+
+        self.version = 0
+        self.status_updated = None
+        self.next_status_at = 0
+        self.next_info_at = 0
+        self.full = None        # {"json", "gzip"} for the current version
+
+    # --- Upstream ---
+
+    def _get(self, name):
+        import requests
+        resp = requests.get(f"{self.base_url}/{name}.json", timeout=10)
+        resp.raise_for_status()
+        return resp.json()
+
+    def refresh(self):
+        """
+        Fetches whichever feeds are due. Returns seconds until the next refresh.
+        Status is re-fetched after the feed's ttl (at least min_refresh_seconds).
+        """
+        now = time.time()
+        if now >= self.next_info_at:
+            info = self._get('station_information')
+            self.apply_info(info)
+            self.next_info_at = now + max(INFO_REFRESH_SECONDS, info.get('ttl') or 0)
+        if now >= self.next_status_at:
+            status = self._get('station_status')
+            self.apply_status(status)
+            self.next_status_at = now + max(self.min_refresh_seconds, status.get('ttl') or 0)
+        return max(0, min(self.next_info_at, self.next_status_at) - time.time())
+
+    def start(self, on_update=None):
+        """
+        Refreshes on a background thread for the life of the process.
+        on_update(proxy) is called after every refresh that produced a new version.
+        """
+        def loop():
+            while True:
+                try:
+                    version = self.version
+                    delay = self.refresh()
+                    if on_update and self.version != version:
+                        on_update(self)
+                except Exception as e:
+                    print(f"[GBFS] Refresh failed: {e}", flush=True)
+                    delay = self.min_refresh_seconds
+                time.sleep(delay)
+        threading.Thread(target=loop, name="gbfs-refresher", daemon=True).start()
+        return self
+
+    # --- State updates ---
+
+    def _next_version(self, feed_updated):
+        return max(int(feed_updated or 0), self.version + 1)
+
+    def apply_info(self, info):
+        """Joins station_information. A changed station set invalidates all older versions."""
+        rows = []
+        for s in info.get('data', {}).get('stations', []):
+            if s.get('lat') is None or s.get('lon') is None:
+                continue
+            rows.append([s['station_id'], s.get('name', ''), s['lat'], s['lon'], s.get('capacity', 0)])
+        rows.sort(key=lambda r: r[0])
+
+        with self.lock:
+            if rows == self.static:
+                return False
+            old_status = {row[0]: self.status[i] for i, row in enumerate(self.static)}
+            self.version = self._next_version(info.get('last_updated'))
+            self.static = rows
+            self.status = [old_status.get(row[0], [0, 0, 0]) for row in rows]
+            self.changelog.clear()
+            self.changelog_floor = self.version
+            self._reindex()
+            self.full = None
+        print(f"[GBFS] Station information: {len(rows)} stations (version {self.version})", flush=True)
+        return True
+
+    def apply_status(self, status):
+        """Overlays station_status; only stations whose numbers moved are touched."""
+        feed_updated = status.get('last_updated')
+        with self.lock:
+            if feed_updated is not None and feed_updated == self.status_updated:
+                return 0
+            version = self._next_version(feed_updated)
+            touched = []
+            for s in status.get('data', {}).get('stations', []):
+                idx = self.index.get(s.get('station_id'))
+                if idx is None:
+                    continue
+                row = [s.get('num_bikes_available', 0), s.get('num_ebikes_available', 0),
+                       s.get('num_docks_available', 0)]
+                if row != self.status[idx]:
+                    self.status[idx] = row
+                    touched.append(idx)
+            self.status_updated = feed_updated
+            if touched:
+                self.version = version
+                if len(self.changelog) == self.changelog.maxlen:
+                    self.changelog_floor = self.changelog[0][0]
+                self.changelog.append((version, touched))
+                self.full = None
+        print(f"[GBFS] Station status: {len(touched)} of {len(self.static)} changed (version {self.version})", flush=True)
+        return len(touched)
+
+    def _reindex(self):
+        self.index = {row[0]: i for i, row in enumerate(self.static)}
+        self.grid = {}
+        for i, row in enumerate(self.static):
+            self.grid.setdefault(_cell(row[2], row[3]), []).append(i)
+
+    # --- Pre-fork sharing ---
+
+    def export_state(self):
+        """Serializes everything a worker needs to answer requests (see load_state)."""
+        with self.lock:
+            return _dumps({
+                "version": self.version,
+                "static": self.static,
+                "status": self.status,
+                "changelog": list(self.changelog),
+                "changelogFloor": self.changelog_floor
+            })
+
+    def load_state(self, payload):
+        data = json.loads(payload)
+        with self.lock:
+            self.version = data["version"]
+            self.static = data["static"]
+            self.status = data["status"]
+            self.changelog = deque((tuple(entry) for entry in data["changelog"]), maxlen=CHANGELOG_VERSIONS)
+            self.changelog_floor = data["changelogFloor"]
+            self._reindex()
+            self.full = None
+
+    # --- Queries ---
+
+    def _in_bbox(self, bbox):
+        """Station indexes inside bbox, visiting only the grid cells it overlaps."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        lat0, lon0 = _cell(min_lat, min_lon)
+        lat1, lon1 = _cell(max_lat, max_lon)
+        found = []
+        if (lat1 - lat0 + 1) * (lon1 - lon0 + 1) > len(self.grid):
+            cells = [key for key in self.grid if lat0 <= key[0] <= lat1 and lon0 <= key[1] <= lon1]
+        else:
+            cells = [(a, b) for a in range(lat0, lat1 + 1) for b in range(lon0, lon1 + 1)]
+        for key in cells:
+            for i in self.grid.get(key, ()):
+                row = self.static[i]
+                if min_lat <= row[2] <= max_lat and min_lon <= row[3] <= max_lon:
+                    found.append(i)
+        return found
+
+    def _changed_since(self, since):
+        """Indexes changed after `since`, or None if the changelog doesn't reach back that far."""
+        if since < self.changelog_floor or since > self.version:
+            return None
+        touched = set()
+        for version, indexes in reversed(self.changelog):
+            if version <= since:
+                break
+            touched.update(indexes)
+        return sorted(touched)
+
+    def payload(self, since=None, bbox=None):
+        """
+        Returns the response body (bytes) for a request. Unfiltered full payloads are
+        cached per version; use full_payload() to also get the gzipped copy.
+        """
+        with self.lock:
+            indexes = None if since is None else self._changed_since(since)
+            if indexes is None:
+                rows = range(len(self.static)) if bbox is None else self._in_bbox(bbox)
+                return _dumps({
+                    "version": self.version,
+                    "full": True,
+                    "fields": FIELDS,
+                    "stations": [self.static[i] + self.status[i] for i in rows]
+                })
+            if bbox is not None:
+                min_lon, min_lat, max_lon, max_lat = bbox
+                indexes = [i for i in indexes
+                           if min_lat <= self.static[i][2] <= max_lat and min_lon <= self.static[i][3] <= max_lon]
+            return _dumps({
+                "version": self.version,
+                "full": False,
+                "since": since,
+                "fields": DELTA_FIELDS,
+                "stations": [[self.static[i][0]] + self.status[i] for i in indexes]
+            })
+
+    def full_payload(self):
+        """Returns {"json", "gzip"} for the unfiltered full payload, built once per version."""
+        full = self.full
+        if full is None or full["version"] != self.version:
+            body = self.payload()
+            full = self.full = {"version": self.version, "json": body, "gzip": gzip.compress(body, compresslevel=6)}
+        return full
+
+    def stats(self):
+        return {
+            "stations": len(self.static),
+            "version": self.version,
+            "cells": len(self.grid),
+            "changelog": len(self.changelog)
+        }
@@ -0,0 +1,23 @@
+"""
+MTA GTFS-RT feed locations, shared by server.py and the record/replay scripts
+so recordings always match what the server polls. Importing this has no side
+effects, unlike importing server.py.
+"""
+import os
+
+# Upstream base URL. Point this at scripts/mock_mta.py to run fully offline.
+MTA_FEED_BASE_URL = os.environ.get('MTA_FEED_BASE_URL', "https://api-endpoint.mta.info/Dataservice").rstrip('/')
+ALERTS_FEED_PATH = "mtagtfsfeed_id=c"
+
+# GTFS-RT trip feeds, relative to MTA_FEED_BASE_URL
+FEED_PATHS = [
+    "mtagtfsfeeds/nyct%2Fgtfs",      # 1-7
+    "mtagtfsfeeds/nyct%2Fgtfs-ace",  # A/C/E
+    "mtagtfsfeeds/nyct%2Fgtfs-nqrw", # N/Q/R/W
+    "mtagtfsfeeds/nyct%2Fgtfs-bdfm", # B/D/F/M
+    "mtagtfsfeeds/nyct%2Fgtfs-l",    # L
+    "mtagtfsfeeds/nyct%2Fgtfs-g",    # G
+    "mtagtfsfeeds/nyct%2Fgtfs-jz",   # J/Z
+    "mtagtfsfeeds/nyct%2Fgtfs-7",    # 7
+    "mtagtfsfeeds/nyct%2Fgtfs-si"    # SIR
+]
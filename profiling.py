@@ -0,0 +1,346 @@
+"""
+On-demand profiling for server.py, switched on and off at runtime through
+/api/admin/profile.
+
+- Request sampling: a `sample_rate` fraction of GET requests runs under
+  cProfile, and all of them are merged into one pstats aggregate. While a
+  sampled request runs, a sampler thread also records its real call stack
+  every STACK_INTERVAL, for collapsed-stack (flamegraph) output.
+- Stage timers: `with PROFILER.timer("realtime.parse"):` accumulates
+  count / total / max per named stage.
+
+Both are off by default. When disabled, request sampling costs one attribute
+check and timer() returns a shared no-op context manager.
+
+In pre-fork mode each process profiles itself. Settings live in a small
+config file in the shared directory, which every process re-reads at most
+once a second. Every process dumps its aggregates to the same directory in
+the background, so whichever worker answers the admin request can merge
+them all.
+"""
+import contextlib
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+
+NULL_TIMER = contextlib.nullcontext()
+SYNC_SECONDS = 1.0
+DUMP_SECONDS = 1.0
+MAX_STACK_DEPTH = 64
+STACK_INTERVAL = 0.001
+MAX_STACKS = 5000         # distinct stacks kept; further new ones count as "[other]"
+
+
+class _StageTimer:
+    __slots__ = ("profiler", "stage", "start")
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.stage, time.perf_counter() - self.start)
+
+
+class Profiler:
+    def __init__(self, sample_rate=0.0, timers=False):
+        self.sample_rate = sample_rate
+        self.timers = timers
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.share_dir = None
+        self._next_sync = 0
+        self._config_mtime = None
+        self._dumper_pid = None
+        self._sampler_pid = None
+        self._active = set()        # idents of threads inside a sampled request
+        self._wake = threading.Event()
+        self._dirty = False
+        self._clear()
+
+    def _clear(self):
+        self.stats = None     # pstats.Stats over every sampled request
+        self.samples = 0
+        self.stages = {}      # stage -> [count, total seconds, max seconds]
+        self.stacks = {}      # "outer;...;inner" -> samples
+
+    # --- Configuration ---
+
+    def share(self, directory):
+        """Pre-fork: call before forking so every process follows one config file."""
+        os.makedirs(directory, exist_ok=True)
+        self.share_dir = directory
+        self._write_config()
+
+    def unshare(self):
+        """Deletes the files share() and the dumps put in the shared directory, then the directory if empty."""
+        if self.share_dir is None:
+            return
+        for pattern in ("config.json*", "*.prof*", "*.stages.json*"):
+            for path in glob.glob(os.path.join(self.share_dir, pattern)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        try:
+            os.rmdir(self.share_dir)
+        except OSError:
+            pass
+
+    def _config_path(self):
+        return os.path.join(self.share_dir, "config.json")
+
+    def _write_config(self):
+        path = self._config_path()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"sampleRate": self.sample_rate, "timers": self.timers, "generation": self.generation}, f)
+        os.replace(tmp_path, path)
+
+    def configure(self, sample_rate=None, timers=None, reset=False):
+        with self.lock:
+            if sample_rate is not None:
+                self.sample_rate = min(1.0, max(0.0, sample_rate))
+            if timers is not None:
+                self.timers = timers
+            if reset:
+                self.generation += 1
+                self._clear()
+        if self.share_dir is not None:
+            if reset:
+                for path in glob.glob(os.path.join(self.share_dir, "*.prof")) + \
+                        glob.glob(os.path.join(self.share_dir, "*.stages.json")):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+            self._write_config()
+
+    def _sync(self):
+        """Picks up config changes made by other processes (checked at most once per SYNC_SECONDS)."""
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + SYNC_SECONDS
+        try:
+            mtime = os.stat(self._config_path()).st_mtime_ns
+            if mtime == self._config_mtime:
+                return
+            with open(self._config_path()) as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._config_mtime = mtime
+        with self.lock:
+            self.sample_rate = config["sampleRate"]
+            self.timers = config["timers"]
+            if config["generation"] != self.generation:
+                self.generation = config["generation"]
+                self._clear()
+
+    # --- Collection ---
+
+    def should_sample(self):
+        if self.share_dir is not None:
+            self._sync()
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def run(self, fn, *args):
+        """Calls fn under cProfile (and the stack sampler) and folds the result into the aggregate."""
+        if self._sampler_pid != os.getpid():
+            # Threads don't survive fork(), so each process starts its own sampler
+            self._sampler_pid = os.getpid()
+            threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True).start()
+        ident = threading.get_ident()
+        profile = cProfile.Profile()
+        with self.lock:
+            self._active.add(ident)
+        self._wake.set()
+        try:
+            return profile.runcall(fn, *args)
+        finally:
+            with self.lock:
+                self._active.discard(ident)
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+                self.samples += 1
+            self._mark_dirty()
+
+    def _sample_loop(self):
+        """
+        Records the stack of every thread inside a sampled request each STACK_INTERVAL.
+        Keeps ticking for a second after the last one, so that the tick phase doesn't
+        restart with each request and short requests are sampled in proportion to
+        their duration. Sleeps on the event otherwise.
+        """
+        stop_codes = (Profiler.run.__code__, cProfile.Profile.runcall.__code__)
+        idle_since = None
+        while True:
+            self._wake.wait()
+            time.sleep(STACK_INTERVAL)
+            with self.lock:
+                active = list(self._active)
+                if not active:
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since > 1:
+                        self._wake.clear()
+                        idle_since = None
+                    continue
+                idle_since = None
+            frames = sys._current_frames()
+            for ident in active:
+                frame = frames.get(ident)
+                labels = []
+                # Innermost first, up to (not including) the profiler's own frames
+                while frame is not None and frame.f_code not in stop_codes:
+                    if len(labels) == MAX_STACK_DEPTH:
+                        labels.append("[truncated]")
+                        break
+                    code = frame.f_code
+                    labels.append(f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})")
+                    frame = frame.f_back
+                if not labels:
+                    continue
+                stack = ";".join(reversed(labels))
+                with self.lock:
+                    if ident not in self._active:
+                        continue
+                    if stack not in self.stacks and len(self.stacks) >= MAX_STACKS:
+                        stack = "[other]"
+                    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            del frames
+
+    def timer(self, stage):
+        if self.share_dir is not None:
+            self._sync()
+        if not self.timers:
+            return NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def _record(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+        self._mark_dirty()
+
+    # --- Sharing between processes ---
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self.share_dir is not None and self._dumper_pid != os.getpid():
+            # Threads don't survive fork(), so each process starts its own dumper
+            self._dumper_pid = os.getpid()
+            threading.Thread(target=self._dump_loop, name="profile-dumper", daemon=True).start()
+
+    def _dump_loop(self):
+        while True:
+            time.sleep(DUMP_SECONDS)
+            if self._dirty:
+                try:
+                    self._dump()
+                except OSError as e:
+                    print(f"[Profile] Dump failed: {e}", flush=True)
+
+    def _dump(self):
+        base = os.path.join(self.share_dir, str(os.getpid()))
+        with self.lock:
+            self._dirty = False
+            stages = {"generation": self.generation, "samples": self.samples,
+                      "stages": self.stages, "stacks": self.stacks}
+            with open(f"{base}.stages.json.tmp", 'w') as f:
+                json.dump(stages, f)
+            os.replace(f"{base}.stages.json.tmp", f"{base}.stages.json")
+            if self.stats is not None:
+                self.stats.dump_stats(f"{base}.prof.tmp")
+                os.replace(f"{base}.prof.tmp", f"{base}.prof")
+
+    # --- Reports ---
+
+    def _aggregate(self, stream=None):
+        """Returns (pstats.Stats or None, samples, stages, stacks) across every process sharing the directory."""
+        if self.share_dir is None:
+            with self.lock:
+                stats = None
+                if self.stats is not None:
+                    stats = pstats.Stats(stream=stream)
+                    stats.add(self.stats)
+                return stats, self.samples, {k: list(v) for k, v in self.stages.items()}, dict(self.stacks)
+
+        self._dump()
+        samples, stages, stacks, profiles = 0, {}, {}, []
+        for path in glob.glob(os.path.join(self.share_dir, "*.stages.json")):
+            try:
+                with open(path) as f:
+                    dump = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if dump["generation"] != self.generation:
+                continue
+            samples += dump["samples"]
+            for stage, (count, total, longest) in dump["stages"].items():
+                entry = stages.setdefault(stage, [0, 0.0, 0.0])
+                entry[0] += count
+                entry[1] += total
+                entry[2] = max(entry[2], longest)
+            for stack, count in dump.get("stacks", {}).items():
+                stacks[stack] = stacks.get(stack, 0) + count
+            prof_path = path[:-len(".stages.json")] + ".prof"
+            if os.path.exists(prof_path):
+                profiles.append(prof_path)
+        stats = None
+        if profiles:
+            stats = pstats.Stats(stream=stream)
+            for path in profiles:
+                with contextlib.suppress(OSError, EOFError, ValueError):
+                    stats.add(path)
+        return stats, samples, stages, stacks
+
+    def status(self):
+        _, samples, stages, stacks = self._aggregate()
+        return {
+            "sampleRate": self.sample_rate,
+            "timers": self.timers,
+            "samples": samples,
+            "stackSamples": sum(stacks.values()),
+            "stages": {
+                stage: {
+                    "count": count,
+                    "total_ms": round(total * 1000, 2),
+                    "mean_ms": round(total * 1000 / count, 3) if count else 0,
+                    "max_ms": round(longest * 1000, 2)
+                }
+                for stage, (count, total, longest) in sorted(stages.items())
+            }
+        }
+
+    def pstats_text(self, sort="cumulative", limit=40):
+        stream = io.StringIO()
+        stats, samples, _, _ = self._aggregate(stream)
+        if stats is None:
+            return "No profiled requests yet.\n"
+        stream.write(f"{samples} sampled request(s)\n")
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def collapsed(self):
+        """
+        Collapsed-stack lines ("outer;...;inner <samples>") for flamegraph.pl or
+        speedscope. Each line is a stack actually observed by the sampler, weighted
+        by how many STACK_INTERVAL samples landed on it.
+        """
+        _, _, _, stacks = self._aggregate()
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
@@ -0,0 +1,342 @@
+"""
+Append-only on-disk archive of realtime snapshots.
+
+Each hourly segment file holds length-prefixed, zlib-compressed records. A segment
+always opens with a keyframe (the full trip list); following records are per-trip
+deltas against the previous refresh, with a fresh keyframe every KEYFRAME_INTERVAL
+records. Only keyframes go into the segment's `.idx` file, so a lookup is a binary
+search to the nearest keyframe plus at most KEYFRAME_INTERVAL - 1 deltas.
+"""
+import bisect
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+RECORD_HEADER = struct.Struct('>BdI')  # kind, timestamp, payload length
+INDEX_ENTRY = struct.Struct('>dQ')     # keyframe timestamp, byte offset
+KIND_KEYFRAME = 0
+KIND_DELTA = 1
+
+KEYFRAME_INTERVAL = 20
+SEGMENT_SECONDS = 3600
+
+
+def _trip_key(trip):
+    return (trip.get('tripId'), trip.get('routeId'))
+
+
+def _encode(obj):
+    return zlib.compress(json.dumps(obj, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def _decode(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+class Segment:
+    """One hour of records plus its sparse keyframe index."""
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path[:-len('.log')] + '.idx'
+        self.keyframes = []  # [(ts, offset)], ascending
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            self.keyframes = [INDEX_ENTRY.unpack_from(data, i) for i in range(0, usable, INDEX_ENTRY.size)]
+        elif os.path.exists(path):
+            self._rebuild_index()
+
+    @property
+    def start_ts(self):
+        return self.keyframes[0][0] if self.keyframes else None
+
+    def _rebuild_index(self):
+        """Recovers the keyframe index by walking record headers."""
+        for kind, ts, offset, _ in self.scan(0, with_payload=False):
+            if kind == KIND_KEYFRAME:
+                self.keyframes.append((ts, offset))
+        with open(self.index_path, 'wb') as f:
+            for entry in self.keyframes:
+                f.write(INDEX_ENTRY.pack(*entry))
+
+    def scan(self, offset, with_payload=True):
+        """Yields (kind, ts, offset, payload) from `offset`. Stops at a torn trailing record."""
+        with open(self.path, 'rb') as f:
+            end = os.fstat(f.fileno()).st_size
+            f.seek(offset)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                kind, ts, length = RECORD_HEADER.unpack(header)
+                if kind not in (KIND_KEYFRAME, KIND_DELTA) or offset + RECORD_HEADER.size + length > end:
+                    return
+                if with_payload:
+                    payload = f.read(length)
+                    if len(payload) < length:
+                        return
+                else:
+                    payload = None
+                    f.seek(length, os.SEEK_CUR)
+                yield kind, ts, offset, payload
+                offset += RECORD_HEADER.size + length
+
+    def repair(self):
+        """
+        Truncates a torn trailing record (a crash mid-write) so that appends
+        start on a record boundary, and drops index entries past the cut.
+        Returns the number of bytes removed.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        size = os.path.getsize(self.path)
+        valid = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                kind, _, length = RECORD_HEADER.unpack(header)
+                if kind not in (KIND_KEYFRAME, KIND_DELTA) or valid + RECORD_HEADER.size + length > size:
+                    break
+                valid += RECORD_HEADER.size + length
+                f.seek(valid)
+        if valid == size:
+            return 0
+        with open(self.path, 'r+b') as f:
+            f.truncate(valid)
+        kept = [kf for kf in self.keyframes if kf[1] < valid]
+        if len(kept) != len(self.keyframes):
+            self.keyframes = kept
+            with open(self.index_path, 'wb') as f:
+                for entry in kept:
+                    f.write(INDEX_ENTRY.pack(*entry))
+        return size - valid
+
+    def size(self):
+        total = 0
+        for path in (self.path, self.index_path):
+            if os.path.exists(path):
+                total += os.path.getsize(path)
+        return total
+
+    def remove(self):
+        for path in (self.path, self.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class SnapshotArchive:
+    """
+    Archives each realtime refresh and answers point-in-time lookups.
+
+    append() only enqueues; diffing, compression and disk I/O happen on a
+    background writer thread so the request path never waits on them.
+    A readonly instance (pre-fork workers) picks up the writer's new
+    segments and keyframes from disk before each lookup.
+    """
+    def __init__(self, directory, retention_hours=24, keyframe_interval=KEYFRAME_INTERVAL, readonly=False):
+        self.directory = directory
+        self.readonly = readonly
+        self.retention_seconds = retention_hours * 3600
+        self.keyframe_interval = keyframe_interval
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=8)
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.segments = []  # ascending by start_ts
+        self._load_segments()
+
+        # Writer state (only touched by the writer thread)
+        self._current = None
+        self._file = None
+        self._index_file = None
+        self._prev = None
+        self._since_keyframe = 0
+        self._thread = None
+
+        # Playback usually scrubs forward, so remember where the last lookup stopped
+        self._cursor = None  # (segment path, keyframe offset, state, next offset, state ts)
+        self._cursor_lock = threading.Lock()
+
+    def _load_segments(self):
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith('rt-') and name.endswith('.log'):
+                segment = Segment(os.path.join(self.directory, name))
+                if segment.keyframes:
+                    segments.append(segment)
+        segments.sort(key=lambda s: s.start_ts)
+        with self.lock:
+            self.segments = segments
+
+    def _sync(self):
+        """Readonly mode: reload only if another process added or pruned files."""
+        with self.lock:
+            known = {s.index_path: len(s.keyframes) * INDEX_ENTRY.size for s in self.segments}
+        try:
+            names = [n for n in os.listdir(self.directory) if n.startswith('rt-') and n.endswith('.idx')]
+            current = {os.path.join(self.directory, n): os.path.getsize(os.path.join(self.directory, n)) for n in names}
+        except FileNotFoundError:
+            return
+        if {p: size for p, size in current.items() if size} != known:
+            self._load_segments()
+
+    # --- Writing ---
+
+    def start(self):
+        if self.readonly:
+            raise RuntimeError("Readonly archives cannot be written")
+        self._thread = threading.Thread(target=self._run, name="rt-archive", daemon=True)
+        self._thread.start()
+        return self
+
+    def append(self, ts, trips):
+        """Queues a snapshot for archiving. Never blocks; drops if the writer falls behind."""
+        try:
+            self.queue.put_nowait((ts, trips))
+        except queue.Full:
+            self.dropped += 1
+            print(f"[Archive] Writer behind, dropped snapshot at {ts:.0f} ({self.dropped} total)", flush=True)
+
+    def _run(self):
+        while True:
+            ts, trips = self.queue.get()
+            try:
+                self.write_snapshot(ts, trips)
+            except Exception as e:
+                print(f"[Archive] Write failed: {e}", flush=True)
+                # Force a keyframe next time so a lost delta can't corrupt playback
+                self._prev = None
+
+    def write_snapshot(self, ts, trips):
+        """Writes one snapshot synchronously (the writer thread calls this)."""
+        segment_name = time.strftime('rt-%Y%m%dT%H.log', time.gmtime(ts // SEGMENT_SECONDS * SEGMENT_SECONDS))
+        if self._current is None or os.path.basename(self._current.path) != segment_name:
+            self._open_segment(os.path.join(self.directory, segment_name))
+
+        current = {_trip_key(t): t for t in trips}
+        if self._prev is None or self._since_keyframe >= self.keyframe_interval:
+            kind, payload = KIND_KEYFRAME, _encode({"trips": trips})
+            self._since_keyframe = 0
+        else:
+            prev = self._prev
+            upsert = [t for key, t in current.items() if prev.get(key) != t]
+            remove = [list(key) for key in prev if key not in current]
+            kind, payload = KIND_DELTA, _encode({"upsert": upsert, "remove": remove})
+        self._since_keyframe += 1
+        self._prev = current
+
+        offset = self._file.tell()
+        self._file.write(RECORD_HEADER.pack(kind, ts, len(payload)))
+        self._file.write(payload)
+        self._file.flush()
+
+        if kind == KIND_KEYFRAME:
+            self._index_file.write(INDEX_ENTRY.pack(ts, offset))
+            self._index_file.flush()
+            with self.lock:
+                self._current.keyframes.append((ts, offset))
+                if self._current not in self.segments:
+                    self.segments.append(self._current)
+        return kind, len(payload)
+
+    def _open_segment(self, path):
+        for f in (self._file, self._index_file):
+            if f:
+                f.close()
+        with self.lock:
+            existing = [s for s in self.segments if s.path == path]
+        self._current = existing[0] if existing else Segment(path)
+        torn = self._current.repair()
+        if torn:
+            print(f"[Archive] Truncated {torn} bytes of torn record from {os.path.basename(path)}", flush=True)
+        self._file = open(path, 'ab')
+        self._index_file = open(self._current.index_path, 'ab')
+        # Every segment must be decodable on its own
+        self._prev = None
+        self._prune()
+
+    def _prune(self):
+        """Drops whole segments that fall outside the retention window."""
+        cutoff = time.time() - self.retention_seconds
+        with self.lock:
+            expired = [s for s in self.segments[:-1] if s is not self._current and s.start_ts < cutoff]
+            # A segment may still be needed if the next one starts after the cutoff
+            for segment in expired:
+                following = self.segments[self.segments.index(segment) + 1]
+                if following.start_ts <= cutoff:
+                    self.segments.remove(segment)
+                    segment.remove()
+                    print(f"[Archive] Pruned {os.path.basename(segment.path)}", flush=True)
+
+    # --- Reading ---
+
+    def lookup(self, at):
+        """
+        Returns (ts, trips) for the latest snapshot at or before `at`,
+        or None when the archive has nothing that old.
+        """
+        if self.readonly:
+            self._sync()
+        with self.lock:
+            starts = [s.start_ts for s in self.segments]
+            idx = bisect.bisect_right(starts, at) - 1
+            if idx < 0:
+                return None
+            segment = self.segments[idx]
+            keyframes = list(segment.keyframes)
+
+        k = bisect.bisect_right([kf[0] for kf in keyframes], at) - 1
+        keyframe_offset = keyframes[k][1]
+
+        with self._cursor_lock:
+            cursor = self._cursor
+        if cursor and cursor[:2] == (segment.path, keyframe_offset) and cursor[4] <= at:
+            # Resume from the previous lookup instead of re-reading the keyframe
+            state, offset, state_ts = dict(cursor[2]), cursor[3], cursor[4]
+        else:
+            state, offset, state_ts = None, keyframe_offset, None
+
+        for kind, ts, record_offset, payload in segment.scan(offset):
+            if ts > at:
+                break
+            try:
+                record = _decode(payload)
+            except (zlib.error, ValueError) as e:
+                # Serve the last snapshot that decoded (or a 404) rather than failing the request
+                print(f"[Archive] Unreadable record at {os.path.basename(segment.path)}:{record_offset}: {e}", flush=True)
+                break
+            if kind == KIND_KEYFRAME:
+                state = {_trip_key(t): t for t in record["trips"]}
+            elif state is not None:
+                for key in record["remove"]:
+                    state.pop(tuple(key), None)
+                for trip in record["upsert"]:
+                    state[_trip_key(trip)] = trip
+            state_ts = ts
+            offset = record_offset + RECORD_HEADER.size + len(payload)
+        if state is None:
+            return None
+
+        with self._cursor_lock:
+            self._cursor = (segment.path, keyframe_offset, state, offset, state_ts)
+        return state_ts, list(state.values())
+
+    def stats(self):
+        with self.lock:
+            segments = list(self.segments)
+        return {
+            "segments": len(segments),
+            "bytes": sum(s.size() for s in segments),
+            "oldest": segments[0].start_ts if segments else None,
+            "dropped": self.dropped
+        }
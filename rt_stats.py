@@ -0,0 +1,239 @@
+"""
+Incremental service-quality analytics over realtime refreshes.
+
+Each refresh is diffed against the previous one by a per-trip signature
+(next stop, predicted time), taken from the trip's summary fields. The diff is
+a set difference of dict items, so it runs in C, and only trips whose
+signature changed do any Python-level work. When a trip's next stop advances,
+the train has passed the previous one, and that pass is recorded:
+- delay at the stop (predicted time vs. the schedule for that trip and stop)
+- delay gained on the segment since the trip's previous pass
+- headway since the previous train of the same route/direction passed the stop
+
+Distributions are fixed-bin histograms, keyed by route/direction and by
+route/direction/segment. Memory is therefore bounded by the network size, not
+by traffic. Everything resets at the start of each service day (4 AM NYC).
+"""
+import datetime
+import json
+
+DELAY_EDGES = [-300, -120, -60, 0, 60, 120, 180, 300, 600, 900, 1800]
+HEADWAY_EDGES = [60, 120, 180, 240, 300, 420, 600, 900, 1200, 1800, 3600]
+MAX_HEADWAY_SECONDS = 2 * 3600
+MAX_DELAY_SECONDS = 3 * 3600      # larger gaps are trip ID mismatches, not delays
+SERVICE_DAY_START_HOUR = 4
+
+
+def _nyc_tz():
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo("America/New_York")
+    except ImportError:
+        return datetime.timezone(datetime.timedelta(hours=-4))
+
+
+class Histogram:
+    """
+    Counts per fixed bin: (-inf, e0), [e0, e1), ..., [eN, inf). Each bin also keeps
+    its sum, so quantiles report the mean of the bin they fall in rather than
+    an interpolated guess, which stays exact when values cluster.
+    """
+    __slots__ = ("edges", "counts", "sums", "n", "total")
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.sums = [0] * (len(edges) + 1)
+        self.n = 0
+        self.total = 0
+
+    def add(self, value):
+        i = 0
+        while i < len(self.edges) and value >= self.edges[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sums[i] += value
+        self.n += 1
+        self.total += value
+
+    def quantile(self, q):
+        target = q * self.n
+        seen = 0
+        for count, total in zip(self.counts, self.sums):
+            if count and seen + count >= target:
+                return round(total / count)
+            seen += count
+        return None
+
+    def summary(self):
+        return {
+            "n": self.n,
+            "mean": round(self.total / self.n) if self.n else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "bins": self.counts
+        }
+
+
+class ServiceStats:
+    def __init__(self):
+        self.tz = _nyc_tz()
+        self._reset(None)
+        self.version = 0
+        self._schedule_key = None
+        self._scheduled = {}      # tripId -> {stopId: seconds after midnight}
+        self._midnights = {}      # startDate -> unix midnight (NYC)
+        self._payloads = {}       # (version, route) -> bytes
+
+    def _reset(self, service_day):
+        self.service_day = service_day
+        self.signatures = {}      # (tripId, startDate, routeId) -> (next stop, predicted time)
+        self.trip_passes = {}     # (tripId, startDate, routeId) -> (last pass stop, delay there)
+        self.delay = {}           # (route, dir) -> Histogram
+        self.segment_delay = {}   # (route, dir, from stop, to stop) -> Histogram
+        self.headway = {}         # (route, dir) -> Histogram
+        self.last_pass = {}       # (route, dir, stop) -> time the previous train passed
+        self.refreshes = 0
+        self.changed = 0
+        self.passes = 0
+
+    # --- Schedule lookup ---
+
+    def _index_schedule(self, schedule, service):
+        """Rebuilt only when the schedule object or the active service changes."""
+        key = (id(schedule), service)
+        if key == self._schedule_key:
+            return
+        self._schedule_key = key
+        self._scheduled = {}
+        for trips in (schedule or {}).get('routes', {}).values():
+            for trip in trips:
+                if service is None or trip.get('serviceId') == service:
+                    self._scheduled[trip['tripId']] = {s['id']: s['time'] for s in trip['stops']}
+
+    def _midnight(self, start_date):
+        midnight = self._midnights.get(start_date)
+        if midnight is None:
+            try:
+                day = datetime.datetime.strptime(start_date, '%Y%m%d')
+            except (TypeError, ValueError):
+                return None
+            midnight = self._midnights[start_date] = day.replace(tzinfo=self.tz).timestamp()
+        return midnight
+
+    def _delay(self, trip_id, start_date, stop_id, at):
+        scheduled = self._scheduled.get(trip_id, {}).get(stop_id)
+        midnight = self._midnight(start_date) if scheduled is not None else None
+        if midnight is None:
+            return None
+        delay = at - (midnight + scheduled)
+        return delay if abs(delay) <= MAX_DELAY_SECONDS else None
+
+    # --- Updates ---
+
+    def _service_day(self, ts):
+        local = datetime.datetime.fromtimestamp(ts, self.tz) - datetime.timedelta(hours=SERVICE_DAY_START_HOUR)
+        return local.date().isoformat()
+
+    def update(self, updated, trips, schedule=None, service=None):
+        """Folds one realtime snapshot in. Returns the number of trips that changed."""
+        day = self._service_day(updated)
+        if day != self.service_day:
+            self._reset(day)
+        self._index_schedule(schedule, service)
+
+        current = {(t['tripId'], t['startDate'], t['routeId']): (t['stopId'], t['time'])
+                   for t in trips if t['time']}
+        changed = current.items() - self.signatures.items()
+        # Chronological, so passes at the same stop produce headways in order
+        for key, signature in sorted(changed, key=lambda item: item[1][1]):
+            previous = self.signatures.get(key)
+            if previous is not None and previous[0] != signature[0]:
+                self._record_pass(key, previous)
+            self.signatures[key] = signature
+
+        self.refreshes += 1
+        self.changed = len(changed)
+        if changed:
+            self.version += 1
+        return len(changed)
+
+    def _record_pass(self, key, previous):
+        """The train left previous[0] (at about previous[1]) for a new next stop."""
+        trip_id, start_date, route = key
+        stop_id, at = previous
+        prev_stop, prev_delay = self.trip_passes.get(key, (None, None))
+        direction = stop_id[-1] if stop_id[-1:] in ('N', 'S') else '?'
+        self.passes += 1
+
+        pass_key = (route, direction, stop_id)
+        last = self.last_pass.get(pass_key)
+        if last is not None and 0 < at - last <= MAX_HEADWAY_SECONDS:
+            self.headway.setdefault((route, direction), Histogram(HEADWAY_EDGES)).add(at - last)
+        if last is None or at > last:
+            self.last_pass[pass_key] = at
+
+        delay = self._delay(trip_id, start_date, stop_id, at)
+        if delay is not None:
+            self.delay.setdefault((route, direction), Histogram(DELAY_EDGES)).add(delay)
+            if prev_stop is not None and prev_delay is not None:
+                segment = (route, direction, prev_stop, stop_id)
+                self.segment_delay.setdefault(segment, Histogram(DELAY_EDGES)).add(delay - prev_delay)
+        self.trip_passes[key] = (stop_id, delay)
+
+    # --- Output ---
+
+    def payload(self, route=None):
+        """
+        Serialized /api/stats body, built once per version. With `route`, only that
+        route is included, along with its per-segment delay histograms.
+        """
+        key = (self.version, self.service_day, route)
+        cached = self._payloads.get(key)
+        if cached is not None:
+            return cached
+
+        routes = {}
+        for (r, direction), hist in self.delay.items():
+            if route is None or r == route:
+                routes.setdefault(r, {}).setdefault(direction, {})["delay"] = hist.summary()
+        for (r, direction), hist in self.headway.items():
+            if route is None or r == route:
+                routes.setdefault(r, {}).setdefault(direction, {})["headway"] = hist.summary()
+
+        body = {
+            "serviceDay": self.service_day,
+            "version": self.version,
+            "refreshes": self.refreshes,
+            "changedTrips": self.changed,
+            "trackedTrips": len(self.signatures),
+            "passes": self.passes,
+            "edges": {"delay": DELAY_EDGES, "headway": HEADWAY_EDGES},
+            "routes": routes
+        }
+        if route is not None:
+            body["segments"] = [
+                dict(hist.summary(), dir=direction, **{"from": a, "to": b})
+                for (r, direction, a, b), hist in sorted(self.segment_delay.items()) if r == route
+            ]
+
+        payload = json.dumps(body, separators=(',', ':')).encode('utf-8')
+        # Only the current version is ever served again
+        self._payloads = {k: v for k, v in self._payloads.items() if k[0] == self.version}
+        self._payloads[key] = payload
+        return payload
+
+    def export_routes(self):
+        """Route IDs with any data, for publishing per-route payloads."""
+        return sorted({k[0] for k in self.delay} | {k[0] for k in self.headway})
+
+
+def without_route_data(payload):
+    """
+    A /api/stats?route= body for a route with no data, derived from the global
+    payload: the same shape payload(route) returns, with empty routes and segments.
+    """
+    body = json.loads(payload)
+    body["routes"] = {}
+    body["segments"] = []
+    return json.dumps(body, separators=(',', ':')).encode('utf-8')
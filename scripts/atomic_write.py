@@ -0,0 +1,29 @@
+import json
+import os
+import tempfile
+
+def atomic_write_bytes(path, content):
+    """
+    Writes `content` to a temp file in the same directory, fsyncs it, then
+    os.replace()s it over `path`, so a running server only ever sees the old
+    or the new file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """JSON variant of atomic_write_bytes; `dump_kwargs` go to json.dumps."""
+    atomic_write_bytes(path, json.dumps(data, **dump_kwargs).encode('utf-8'))
@@ -0,0 +1,584 @@
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+
+from record_feeds import RECORDINGS_DIR, list_recordings, load_recording
+from mock_mta import start_mock_server
+from mock_gbfs import start_mock_gbfs
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(samples_ms):
+    return {
+        "n": len(samples_ms),
+        "mean_ms": round(statistics.fmean(samples_ms), 2) if samples_ms else 0.0,
+        "p50_ms": round(percentile(samples_ms, 50), 2),
+        "p95_ms": round(percentile(samples_ms, 95), 2),
+        "max_ms": round(max(samples_ms), 2) if samples_ms else 0.0
+    }
+
+
+def timed(fn, iterations):
+    """Runs fn repeatedly with server logging muted. Returns (samples_ms, last result)."""
+    samples, result = [], None
+    for _ in range(iterations):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples, result
+
+
+def bench_parse(server, archive, iterations):
+    _, feeds, _ = load_recording(archive)
+    urls = [f"{server.MTA_FEED_BASE_URL}/{path}" for path in server.FEED_PATHS]
+    contents = [feeds.get(path) for path in server.FEED_PATHS]
+    samples, trips = timed(lambda: server.parse_realtime_contents(urls, contents), iterations)
+    result = summarize(samples)
+    result["trips"] = len(trips)
+    result["input_bytes"] = sum(len(c) for c in contents if c)
+    return result
+
+
+def bench_refresh(server, iterations):
+    samples, trips = timed(server.fetch_realtime_feed, iterations)
+    result = summarize(samples)
+    result["trips"] = len(trips)
+    return result
+
+
+def bench_alerts(server, iterations):
+    samples, alerts = timed(server.fetch_alerts_feed, iterations)
+    result = summarize(samples)
+    result["alerts"] = len(alerts or [])
+    return result
+
+
+def bench_memory(server):
+    """Peak allocation of one refresh and the size of the cached snapshot."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        trips = server.fetch_realtime_feed()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "refresh_peak_kb": round(peak / 1024, 1),
+        "snapshot_retained_kb": round(retained / 1024, 1),
+        "snapshot_json_kb": round(len(json.dumps({"trips": trips})) / 1024, 1),
+        "trips": len(trips)
+    }
+
+
+def bench_archive(server, archives, snapshots):
+    """Cost of archiving one refresh and of an ?at= lookup, on recorded data."""
+    from rt_archive import SnapshotArchive
+
+    frames = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for archive in archives:
+            _, feeds, _ = load_recording(archive)
+            urls = [f"{server.MTA_FEED_BASE_URL}/{path}" for path in server.FEED_PATHS]
+            frames.append(server.parse_realtime_contents(urls, [feeds.get(p) for p in server.FEED_PATHS]))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SnapshotArchive(tmp)
+        start_ts = time.time()
+        write_ms, sizes = [], []
+        for i in range(snapshots):
+            ts = start_ts + i * 30
+            t0 = time.perf_counter()
+            _, size = archive.write_snapshot(ts, frames[i % len(frames)])
+            write_ms.append((time.perf_counter() - t0) * 1000)
+            sizes.append(size)
+
+        lookup_ms = []
+        for _ in range(50):
+            at = start_ts + random.uniform(0, snapshots * 30)
+            t0 = time.perf_counter()
+            archive.lookup(at)
+            lookup_ms.append((time.perf_counter() - t0) * 1000)
+        on_disk = archive.stats()["bytes"]
+
+    result = {"write_" + k: v for k, v in summarize(write_ms).items()}
+    result.update({"lookup_" + k: v for k, v in summarize(lookup_ms).items() if k != "n"})
+    result["bytes_per_snapshot"] = round(on_disk / snapshots)
+    result["max_record_bytes"] = max(sizes)
+    return result
+
+
+def bench_wire(server, archive, iterations):
+    """JSON vs compact realtime (and schedule, if built) encoding on recorded data."""
+    import gzip
+    import wire_format
+
+    _, feeds, _ = load_recording(archive)
+    urls = [f"{server.MTA_FEED_BASE_URL}/{path}" for path in server.FEED_PATHS]
+    with contextlib.redirect_stdout(io.StringIO()):
+        trips = server.parse_realtime_contents(urls, [feeds.get(p) for p in server.FEED_PATHS])
+    updated = time.time()
+
+    cases = {
+        "realtime": (
+            lambda: json.dumps({"updated": updated, "trips": trips}).encode('utf-8'),
+            lambda: wire_format.encode_realtime(updated, trips),
+            json.loads,
+            wire_format.decode_realtime
+        )
+    }
+    if os.path.exists(server.SCHEDULE_FILE):
+        with contextlib.redirect_stdout(io.StringIO()):
+            server.load_schedule()
+            service, bucket = server.schedule_window()
+            response = server.build_schedule_response(service, bucket)
+        cases["schedule"] = (
+            lambda: json.dumps(response).encode('utf-8'),
+            lambda: wire_format.encode_schedule(response),
+            json.loads,
+            wire_format.decode_schedule
+        )
+
+    results = {}
+    for name, (enc_json, enc_compact, dec_json, dec_compact) in cases.items():
+        json_bytes, compact_bytes = enc_json(), enc_compact()
+        assert dec_compact(compact_bytes) == dec_json(json_bytes), f"{name} compact round trip mismatch"
+        results[name] = {
+            "json_kb": round(len(json_bytes) / 1024, 1),
+            "compact_kb": round(len(compact_bytes) / 1024, 1),
+            "json_gzip_kb": round(len(gzip.compress(json_bytes)) / 1024, 1),
+            "compact_gzip_kb": round(len(gzip.compress(compact_bytes)) / 1024, 1),
+            "json_encode_ms": summarize(timed(enc_json, iterations)[0])["p50_ms"],
+            "compact_encode_ms": summarize(timed(enc_compact, iterations)[0])["p50_ms"],
+            "json_decode_ms": summarize(timed(lambda: dec_json(json_bytes), iterations)[0])["p50_ms"],
+            "compact_decode_ms": summarize(timed(lambda: dec_compact(compact_bytes), iterations)[0])["p50_ms"]
+        }
+    return results
+
+
+def bench_endpoint(server, path, duration, concurrency, headers=None):
+    """Hammers one endpoint of an in-process server from `concurrency` client threads."""
+
+    class QuietHandler(server.MyHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = server.ReuseAddrTCPServer(("127.0.0.1", 0), QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    port = httpd.server_address[1]
+
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                conn.request("GET", path, headers=headers or {})
+                resp = conn.getresponse()
+                resp.read()
+                conn.close()
+                if resp.status != 200:
+                    failed += 1
+                    continue
+            except Exception:
+                failed += 1
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    httpd.shutdown()
+    httpd.server_close()
+
+    result = summarize(latencies)
+    result["req_per_s"] = round(len(latencies) / duration, 1)
+    result["errors"] = errors[0]
+    return result
+
+
+def bench_bootstrap(server, iterations):
+    """
+    Cold-start data load: the five separate first-paint requests (in parallel,
+    as the browser issues them) against the single /api/bootstrap stream.
+    Needs data/subway_schedule.json; returns None without it.
+    """
+    if not os.path.exists(server.SCHEDULE_FILE):
+        return None
+    with contextlib.redirect_stdout(io.StringIO()):
+        server.load_schedule()
+    if not server.SCHEDULE_CACHE:
+        return None
+
+    class QuietHandler(server.MyHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = server.ReuseAddrTCPServer(("127.0.0.1", 0), QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    port = httpd.server_address[1]
+    gzip_header = {"Accept-Encoding": "gzip"}
+
+    def get(path, headers):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request("GET", path, headers=headers)
+        resp = conn.getresponse()
+        body = resp.read()
+        conn.close()
+        return len(body)
+
+    def separate():
+        requests = [
+            ('/api/config', gzip_header),
+            ('/data/subway-stations.geojson', gzip_header),
+            ('/data/nyc-neighborhoods.geojson', gzip_header),
+            ('/data/stops_coords.json', gzip_header),
+            ('/api/schedule', dict(gzip_header, Accept=server.COMPACT_MEDIA_TYPE))
+        ]
+        sizes = [0] * len(requests)
+
+        def fetch(i, path, headers):
+            sizes[i] = get(path, headers)
+
+        threads = [threading.Thread(target=fetch, args=(i,) + r) for i, r in enumerate(requests)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(sizes)
+
+    def bundle():
+        return get('/api/bootstrap', gzip_header)
+
+    def cold_bundle():
+        server.BOOTSTRAP_CACHE['version'] = None
+        return bundle()
+
+    def next_bucket_bundle():
+        """What each new 60s schedule bucket costs: the schedule section only."""
+        server.SCHEDULE_RESPONSE['key'] = None
+        return bundle()
+
+    def time_to_config():
+        """Reads the uncompressed stream line by line until the config section arrives."""
+        start = time.perf_counter()
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request("GET", '/api/bootstrap')
+        resp = conn.getresponse()
+        while not resp.readline().startswith(b'{"section":"config"'):
+            pass
+        elapsed = (time.perf_counter() - start) * 1000
+        resp.read()
+        conn.close()
+        return elapsed
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        separate_samples, separate_bytes = timed(separate, iterations)
+        cold_samples, _ = timed(cold_bundle, iterations)
+        bucket_samples, _ = timed(next_bucket_bundle, iterations)
+        warm_samples, bundle_bytes = timed(bundle, iterations)
+        config_samples = [time_to_config() for _ in range(iterations)]
+    httpd.shutdown()
+    httpd.server_close()
+
+    return {
+        "separate_p50_ms": summarize(separate_samples)["p50_ms"],
+        "separate_gzip_bytes": separate_bytes,
+        "bundle_cold_p50_ms": summarize(cold_samples)["p50_ms"],
+        "bundle_next_bucket_p50_ms": summarize(bucket_samples)["p50_ms"],
+        "bundle_warm_p50_ms": summarize(warm_samples)["p50_ms"],
+        "bundle_config_p50_ms": summarize(config_samples)["p50_ms"],
+        "bundle_gzip_bytes": bundle_bytes
+    }
+
+
+def bench_citibike(iterations):
+    """
+    GBFS proxy against the local stand-in: what the browser used to download
+    (both raw feeds) vs the merged payload and a typical ?since= delta, plus
+    grid vs linear-scan bbox lookups.
+    """
+    from gbfs_proxy import GbfsProxy, parse_bbox
+    gbfs, gbfs_url = start_mock_gbfs(ttl=1, churn=0.05)
+    proxy = GbfsProxy(gbfs_url, min_refresh_seconds=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        proxy.refresh()
+        raw_bytes = sum(len(urllib.request.urlopen(f"{gbfs_url}/{name}.json").read())
+                        for name in ('station_information', 'station_status'))
+        since = proxy.version
+        time.sleep(1.1)
+        proxy.refresh()
+    gbfs.shutdown()
+
+    full = proxy.full_payload()
+    delta = proxy.payload(since=since)
+    bbox = parse_bbox("-74.02,40.70,-73.97,40.74")  # Lower Manhattan
+
+    def linear():
+        min_lon, min_lat, max_lon, max_lat = bbox
+        return [i for i, row in enumerate(proxy.static) if min_lat <= row[2] <= max_lat and min_lon <= row[3] <= max_lon]
+
+    return {
+        "stations": len(proxy.static),
+        "raw_feeds_kb": round(raw_bytes / 1024, 1),
+        "full_kb": round(len(full["json"]) / 1024, 1),
+        "full_gzip_kb": round(len(full["gzip"]) / 1024, 1),
+        "delta_kb": round(len(delta) / 1024, 1),
+        "delta_stations": len(json.loads(delta)["stations"]),
+        "delta_ms": summarize(timed(lambda: proxy.payload(since=since), iterations * 10)[0])["p50_ms"],
+        "bbox_payload_ms": summarize(timed(lambda: proxy.payload(bbox=bbox), iterations * 10)[0])["p50_ms"],
+        "bbox_stations": len(linear()),
+        "bbox_grid_ms": summarize(timed(lambda: proxy._in_bbox(bbox), iterations * 10)[0])["p50_ms"],
+        "bbox_linear_ms": summarize(timed(linear, iterations * 10)[0])["p50_ms"]
+    }
+
+
+def bench_search(iterations):
+    """
+    Station search latency over a keystroke-by-keystroke replay of every station
+    name (plus one typo per name): index build, cold queries (empty LRU), warm
+    queries (LRU hits), and the old client-side substring scan for comparison.
+    """
+    from search_index import StationSearchIndex, LRU_SIZE
+    with open(os.path.join(ROOT_DIR, 'data', 'subway-stations.geojson')) as f:
+        geojson = json.load(f)
+    with open(os.path.join(ROOT_DIR, 'data', 'stops_coords.json')) as f:
+        stops = json.load(f)
+
+    build_samples, index = timed(lambda: StationSearchIndex.build(geojson, stops), max(1, iterations // 2))
+    rng = random.Random(7)
+    queries = []
+    for station in index.stations:
+        name = station["name"].lower()
+        queries.extend(name[:n] for n in range(1, min(len(name), 12) + 1))
+        cut = rng.randrange(1, len(name))
+        queries.append(name[:cut] + name[cut + 1:])  # dropped character
+
+    def run_all(subset=None):
+        for q in subset or queries:
+            index.search(q)
+
+    def substring_scan():
+        for q in queries:
+            [s for s in index.stations if q in s["name"].lower()]
+
+    def cold():
+        index.cache.clear()
+        run_all()
+
+    cold_samples, _ = timed(cold, iterations)
+    # Hot set: as many distinct queries as the LRU holds
+    hot = queries[:LRU_SIZE]
+    run_all(hot)
+    warm_samples, _ = timed(lambda: run_all(hot), iterations)
+    scan_samples, _ = timed(substring_scan, iterations)
+    per_query = 1000 / len(queries)  # ms per pass -> us per query
+    per_hot_query = 1000 / len(hot)
+    return {
+        "stations": len(index.stations),
+        "queries": len(queries),
+        "build_ms": summarize(build_samples)["p50_ms"],
+        "cold_us_per_query": round(summarize(cold_samples)["p50_ms"] * per_query, 1),
+        "warm_us_per_query": round(summarize(warm_samples)["p50_ms"] * per_hot_query, 1),
+        "substring_scan_us_per_query": round(summarize(scan_samples)["p50_ms"] * per_query, 1)
+    }
+
+
+def bench_stats(server, archive, iterations):
+    """
+    Analytics update cost per refresh on the recorded trip list with 0%, 10% and
+    100% of trips changed, plus resident size of the histograms.
+    """
+    import copy
+    from rt_stats import ServiceStats
+    _, feeds, _ = load_recording(archive)
+    urls = [f"{server.MTA_FEED_BASE_URL}/{path}" for path in server.FEED_PATHS]
+    with contextlib.redirect_stdout(io.StringIO()):
+        trips = server.parse_realtime_contents(urls, [feeds.get(path) for path in server.FEED_PATHS])
+    now = time.time()
+    rng = random.Random(3)
+
+    def advanced(fraction):
+        """A copy of the snapshot in which `fraction` of the trips moved on by one stop."""
+        moved = copy.deepcopy(trips)
+        for trip in rng.sample(moved, int(len(moved) * fraction)):
+            if len(trip['stopTimeUpdate']) > 1:
+                trip['stopTimeUpdate'] = trip['stopTimeUpdate'][1:]
+                # Summary fields follow the first update, as parse_realtime_contents sets them
+                first = trip['stopTimeUpdate'][0]
+                trip['stopId'] = first['stopId']
+                trip['time'] = (first['arrival'] or {}).get('time') or (first['departure'] or {}).get('time')
+        return moved
+
+    result = {"trips": len(trips)}
+    for fraction in (0.0, 0.1, 1.0):
+        samples = []
+        for _ in range(iterations):
+            stats = ServiceStats()
+            stats.update(now, trips)
+            snapshot = advanced(fraction)
+            start = time.perf_counter()
+            stats.update(now + 30, snapshot)
+            samples.append((time.perf_counter() - start) * 1000)
+        result[f"update_{int(fraction * 100)}pct_ms"] = summarize(samples)["p50_ms"]
+    result["payload_kb"] = round(len(stats.payload()) / 1024, 1)
+    return result
+
+
+def bench_profiling(server, archive, iterations):
+    """
+    Profiler overhead: per-call cost of a stage timer and of the sampling check
+    when disabled and enabled, a realtime parse with timers on or under cProfile,
+    and the cost and size of the report exports.
+    """
+    from profiling import Profiler
+    calls = 200000
+    result = {}
+    for label, profiler in (("off", Profiler()), ("on", Profiler(timers=True))):
+        start = time.perf_counter()
+        for _ in range(calls):
+            with profiler.timer("bench"):
+                pass
+        result[f"timer_{label}_ns"] = round((time.perf_counter() - start) / calls * 1e9)
+    profiler = Profiler()
+    start = time.perf_counter()
+    for _ in range(calls):
+        profiler.should_sample()
+    result["sample_check_off_ns"] = round((time.perf_counter() - start) / calls * 1e9)
+
+    _, feeds, _ = load_recording(archive)
+    urls = [f"{server.MTA_FEED_BASE_URL}/{path}" for path in server.FEED_PATHS]
+    contents = [feeds.get(path) for path in server.FEED_PATHS]
+    parse = lambda: server.parse_realtime_contents(urls, contents)
+    timed(parse, 1)
+    result["parse_off_ms"] = summarize(timed(parse, iterations)[0])["p50_ms"]
+    server.PROFILER.configure(timers=True)
+    result["parse_timers_ms"] = summarize(timed(parse, iterations)[0])["p50_ms"]
+    server.PROFILER.configure(timers=False)
+    result["parse_cprofile_ms"] = summarize(timed(lambda: server.PROFILER.run(parse), iterations)[0])["p50_ms"]
+
+    # Report exports after `iterations` sampled parses
+    start = time.perf_counter()
+    collapsed = server.PROFILER.collapsed()
+    result["collapsed_export_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    result["collapsed_kb"] = round(len(collapsed) / 1024, 1)
+    result["collapsed_stacks"] = collapsed.count("\n")
+    start = time.perf_counter()
+    server.PROFILER.pstats_text()
+    result["pstats_export_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    server.PROFILER.configure(reset=True)
+    return result
+
+
+def print_section(name, result):
+    print(f"\n== {name}")
+    for key, value in result.items():
+        print(f"  {key:<22} {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the realtime pipeline")
+    parser.add_argument("--recordings", default=RECORDINGS_DIR, help="Recording archive or directory")
+    parser.add_argument("--iterations", type=int, default=10, help="Iterations for refresh/parse timings")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds per endpoint load test")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads per endpoint load test")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latency injected by the MTA stand-in")
+    parser.add_argument("--archive-snapshots", type=int, default=60, help="Snapshots written in the archive benchmark")
+    parser.add_argument("--skip-endpoints", action="store_true", help="Skip the HTTP load tests")
+    parser.add_argument("--json", dest="json_out", help="Also write results to this file")
+    args = parser.parse_args()
+
+    archives = [os.path.abspath(p) for p in list_recordings(args.recordings)]
+    if not archives:
+        print(f"No recordings found in {args.recordings}.")
+        print("Run scripts/record_feeds.py (or scripts/record_feeds.py --synthetic) first.")
+        sys.exit(1)
+
+    # Imported only now (it runs its module-level setup) and repointed at the stand-in
+    import server
+    mock, base_url = start_mock_server(archives[-1:], latency_ms=args.latency_ms)
+    server.MTA_FEED_BASE_URL = base_url
+    server.MTA_ALERTS_URL = f"{base_url}/{server.ALERTS_FEED_PATH}"
+    server.ENV = 'production'
+    os.chdir(ROOT_DIR)
+
+    print(f"Benchmarking against {archives[-1]} via {base_url}")
+    results = {
+        "recording": os.path.basename(archives[-1]),
+        "parse": bench_parse(server, archives[-1], args.iterations),
+        "refresh": bench_refresh(server, args.iterations),
+        "alerts_refresh": bench_alerts(server, args.iterations),
+        "memory": bench_memory(server),
+        "archive": bench_archive(server, archives, args.archive_snapshots)
+    }
+    for name, result in bench_wire(server, archives[-1], args.iterations).items():
+        results[f"wire {name}"] = result
+    results["bootstrap"] = bench_bootstrap(server, args.iterations)
+    results["citibike"] = bench_citibike(args.iterations)
+    results["stats"] = bench_stats(server, archives[-1], args.iterations)
+    results["search"] = bench_search(args.iterations)
+    results["profiling"] = bench_profiling(server, archives[-1], args.iterations)
+
+    if not args.skip_endpoints:
+        # Warm the caches so the load test measures serving, not upstream fetches
+        with contextlib.redirect_stdout(io.StringIO()):
+            server.RT_REFRESH_SECONDS = float('inf')
+            server.set_realtime_snapshot(time.time(), server.fetch_realtime_feed())
+            server.ALERTS_CACHE['data'] = server.fetch_alerts_feed() or []
+            server.ALERTS_CACHE['last_updated'] = time.time() + 3600
+            server.build_search_index()
+        for path in ['/api/realtime', '/api/alerts', '/api/config', '/api/search?q=grand%20cent']:
+            results[f"endpoint {path}"] = bench_endpoint(
+                server, path, args.duration, args.concurrency, {"Accept-Encoding": "gzip"}
+            )
+        results["endpoint /api/realtime (compact)"] = bench_endpoint(
+            server, '/api/realtime', args.duration, args.concurrency,
+            {"Accept-Encoding": "gzip", "Accept": "application/vnd.nycmetro.compact+json"}
+        )
+        for rate in (0.1, 1.0):
+            server.PROFILER.configure(sample_rate=rate)
+            results[f"endpoint /api/realtime (profiled {rate:.0%})"] = bench_endpoint(
+                server, '/api/realtime', args.duration, args.concurrency, {"Accept-Encoding": "gzip"}
+            )
+        server.PROFILER.configure(sample_rate=0, reset=True)
+
+    for name, result in results.items():
+        if isinstance(result, dict):
+            print_section(name, result)
+
+    mock.shutdown()
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json_out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,9 @@
 import csv
-import json
 import os
 import sys
 
+from atomic_write import atomic_write_json
+
 INPUT_FILE = os.path.join(os.path.dirname(__file__), '../data/gtfs/stops.txt')
 OUTPUT_FILE = os.path.join(os.path.dirname(__file__), '../data/stops_coords.json')
 
@@ -31,8 +32,7 @@ def build_stops_json():
 
     print(f"Parsed {count} stops.")
     
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(stops, f, separators=(',', ':'))
+    atomic_write_json(OUTPUT_FILE, stops, separators=(',', ':'))
     
     print(f"Wrote {OUTPUT_FILE} ({os.path.getsize(OUTPUT_FILE)} bytes).")
 
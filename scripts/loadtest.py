@@ -0,0 +1,109 @@
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from record_feeds import RECORDINGS_DIR, list_recordings
+from mock_mta import start_mock_server
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, path, timeout=30):
+    """Waits until `path` answers 200 with a non-trivial body."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            body = resp.read()
+            conn.close()
+            if resp.status == 200 and len(body) > 64:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def client(args):
+    port, path, duration, gzip = args
+    headers = {"Accept-Encoding": "gzip"} if gzip else {}
+    done = errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            conn.close()
+            if resp.status == 200:
+                done += 1
+            else:
+                errors += 1
+        except OSError:
+            errors += 1
+    return done, errors
+
+
+def run(workers, base_url, path, duration, clients, gzip):
+    port = free_port()
+    env = dict(os.environ,
+               PORT=str(port), WORKERS=str(workers), ENV='production',
+               MTA_FEED_BASE_URL=base_url, RT_ARCHIVE_DIR='', GBFS_BASE_URL='')
+    proc = subprocess.Popen([sys.executable, 'server.py'], cwd=ROOT_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(port, path):
+            raise RuntimeError(f"server with WORKERS={workers} never became ready")
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(client, [(port, path, duration, gzip)] * clients)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    done = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return done / duration, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test server.py at increasing WORKERS counts")
+    parser.add_argument("--recordings", default=RECORDINGS_DIR, help="Recording archive or directory")
+    parser.add_argument("--workers", default=f"1,2,{max(2, os.cpu_count() or 1)}",
+                        help="Comma separated WORKERS values to compare")
+    parser.add_argument("--path", default="/api/realtime", help="Endpoint to load")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per run")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 4, help="Client processes")
+    parser.add_argument("--gzip", action="store_true", help="Send Accept-Encoding: gzip")
+    args = parser.parse_args()
+
+    archives = list_recordings(args.recordings)
+    if not archives:
+        print("No recordings found. Run scripts/record_feeds.py (or --synthetic) first.")
+        sys.exit(1)
+    mock, base_url = start_mock_server(archives[-1:])
+
+    print(f"{os.cpu_count()} cores, {args.clients} client processes, {args.duration:.0f}s per run on {args.path}")
+    print(f"{'WORKERS':>8} {'req/s':>10} {'speedup':>8} {'errors':>7}")
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(',')]:
+        rate, errors = run(workers, base_url, args.path, args.duration, args.clients, args.gzip)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.1f} {rate / baseline:>7.2f}x {errors:>7}", flush=True)
+    mock.shutdown()
+
+
+if __name__ == '__main__':
+    main()
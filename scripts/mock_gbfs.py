@@ -0,0 +1,137 @@
+import argparse
+import http.server
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+# Rough bounding box of the Citi Bike service area
+NYC_BBOX = (-74.05, 40.64, -73.86, 40.88)
+
+
+class SyntheticGbfs:
+    """
+    Synthetic Citi Bike system. Every `ttl` seconds a `churn` fraction of
+    stations has its availability changed, like the real station_status feed.
+    """
+    def __init__(self, stations=2000, ttl=5, churn=0.05, seed=42):
+        self.rng = random.Random(seed)
+        self.ttl = ttl
+        self.churn = churn
+        self.lock = threading.Lock()
+        self.last_updated = int(time.time())
+        min_lon, min_lat, max_lon, max_lat = NYC_BBOX
+        self.info = []
+        self.status = []
+        for i in range(stations):
+            capacity = self.rng.choice([15, 19, 23, 27, 31, 39, 47])
+            self.info.append({
+                "station_id": f"mock-{i:05d}",
+                "name": f"Mock St & {i} Av",
+                "lat": round(self.rng.uniform(min_lat, max_lat), 6),
+                "lon": round(self.rng.uniform(min_lon, max_lon), 6),
+                "capacity": capacity
+            })
+            self.status.append(self._random_status(i, capacity))
+
+    def _random_status(self, i, capacity):
+        bikes = self.rng.randint(0, capacity)
+        ebikes = self.rng.randint(0, bikes)
+        return {
+            "station_id": f"mock-{i:05d}",
+            "num_bikes_available": bikes,
+            "num_ebikes_available": ebikes,
+            "num_docks_available": capacity - bikes,
+            "is_renting": 1,
+            "is_returning": 1,
+            "last_reported": self.last_updated
+        }
+
+    def _advance(self):
+        steps = (int(time.time()) - self.last_updated) // self.ttl
+        if steps <= 0:
+            return
+        self.last_updated += steps * self.ttl
+        # After a long idle gap, a few rounds of churn are as good as all of them
+        for _ in range(min(steps, 10)):
+            for i in self.rng.sample(range(len(self.status)), int(len(self.status) * self.churn)):
+                self.status[i] = self._random_status(i, self.info[i]["capacity"])
+
+    def feed(self, name):
+        with self.lock:
+            self._advance()
+            if name == "station_information":
+                stations = self.info
+            elif name == "station_status":
+                stations = self.status
+            else:
+                return None
+            return json.dumps({
+                "last_updated": self.last_updated,
+                "ttl": self.ttl,
+                "version": "2.3",
+                "data": {"stations": stations}
+            }).encode('utf-8')
+
+
+def make_handler(system, quiet=True):
+    class MockGbfsHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            name = urlparse(self.path).path.strip('/').rsplit('/', 1)[-1]
+            body = system.feed(name[:-len('.json')] if name.endswith('.json') else name)
+            if body is None:
+                body = b'Unknown feed'
+                self.send_response(404)
+                self.send_header('Content-type', 'text/plain')
+            else:
+                self.send_response(200)
+                self.send_header('Content-type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if not quiet:
+                super().log_message(format, *args)
+
+    return MockGbfsHandler
+
+
+def start_mock_gbfs(host="127.0.0.1", port=0, stations=2000, ttl=5, churn=0.05, seed=42, quiet=True):
+    """
+    Starts the stand-in on a background thread.
+    Returns (httpd, base_url); call httpd.shutdown() when done.
+    """
+    system = SyntheticGbfs(stations=stations, ttl=ttl, churn=churn, seed=seed)
+    httpd = http.server.ThreadingHTTPServer((host, port), make_handler(system, quiet))
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://{host}:{httpd.server_address[1]}/gbfs/en"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Citi Bike GBFS stand-in with synthetic stations")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8003)
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--ttl", type=int, default=5, help="Seconds between status updates")
+    parser.add_argument("--churn", type=float, default=0.05, help="Fraction of stations changing per update")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    httpd, base_url = start_mock_gbfs(args.host, args.port, args.stations, args.ttl, args.churn,
+                                      quiet=not args.verbose)
+    print(f"Serving {args.stations} synthetic stations on {base_url}")
+    print(f"Start the server with: GBFS_BASE_URL={base_url} python server.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        httpd.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import bisect
+import http.server
+import json
+import random
+import sys
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+from record_feeds import RECORDINGS_DIR, list_recordings, load_recording
+
+
+class FeedReplay:
+    """
+    Replays recorded captures along their original timeline.
+    With speedup=10, ten recorded seconds pass per wall-clock second.
+    """
+    def __init__(self, archives, speedup=1.0, loop=True):
+        if not archives:
+            raise ValueError("No recordings found. Run scripts/record_feeds.py first.")
+        self.frames = [load_recording(path)[:2] for path in archives]
+        self.frames.sort(key=lambda f: f[0])
+        self.times = [f[0] for f in self.frames]
+        self.speedup = speedup
+        self.loop = loop
+        self.started = time.time()
+
+        # Treat the gap after the last capture like the average capture interval
+        span = self.times[-1] - self.times[0]
+        step = span / (len(self.times) - 1) if len(self.times) > 1 else 0
+        self.period = span + step
+
+    def current(self):
+        """Returns (recorded_at, feeds) for the frame that is 'live' right now."""
+        if len(self.frames) == 1 or self.period <= 0:
+            return self.frames[0]
+        offset = (time.time() - self.started) * self.speedup
+        if self.loop:
+            offset %= self.period
+        idx = bisect.bisect_right(self.times, self.times[0] + offset) - 1
+        return self.frames[max(0, min(idx, len(self.frames) - 1))]
+
+
+def make_handler(replay, latency_ms=0, jitter_ms=0, error_rate=0.0, quiet=True):
+    class MockMTAHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            path = unquote(urlparse(self.path).path).lstrip('/')
+
+            if path == "_replay":
+                recorded_at, feeds = replay.current()
+                body = json.dumps({
+                    "recorded_at": recorded_at,
+                    "frames": len(replay.frames),
+                    "speedup": replay.speedup,
+                    "feeds": sorted(feeds)
+                }).encode('utf-8')
+                return self._send(200, body, 'application/json')
+
+            delay = latency_ms + (random.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0)
+            if delay > 0:
+                time.sleep(delay / 1000)
+
+            if error_rate and random.random() < error_rate:
+                return self._send(503, b'Service Unavailable', 'text/plain')
+
+            recorded_at, feeds = replay.current()
+            for feed_path, content in feeds.items():
+                if unquote(feed_path) == path:
+                    if content is None:
+                        return self._send(502, b'Feed missing from recording', 'text/plain')
+                    return self._send(200, content, 'application/x-protobuf')
+
+            self._send(404, b'Unknown feed', 'text/plain')
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if not quiet:
+                super().log_message(format, *args)
+
+    return MockMTAHandler
+
+
+def start_mock_server(archives, host="127.0.0.1", port=0, speedup=1.0, loop=True,
+                      latency_ms=0, jitter_ms=0, error_rate=0.0, quiet=True):
+    """
+    Starts the stand-in on a background thread.
+    Returns (httpd, base_url); call httpd.shutdown() when done.
+    """
+    replay = FeedReplay(archives, speedup=speedup, loop=loop)
+    handler = make_handler(replay, latency_ms, jitter_ms, error_rate, quiet)
+    httpd = http.server.ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://{host}:{httpd.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MTA GTFS-RT stand-in that replays recordings")
+    parser.add_argument("recordings", nargs="?", default=RECORDINGS_DIR, help="Recording archive or directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--speedup", type=float, default=1.0, help="Recorded seconds per wall-clock second")
+    parser.add_argument("--no-loop", action="store_true", help="Stay on the last frame instead of looping")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random +/- latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    archives = list_recordings(args.recordings)
+    if not archives:
+        print(f"No recordings found in {args.recordings}. Run scripts/record_feeds.py first.")
+        sys.exit(1)
+
+    httpd, base_url = start_mock_server(
+        archives, host=args.host, port=args.port, speedup=args.speedup, loop=not args.no_loop,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        quiet=not args.verbose
+    )
+    print(f"Replaying {len(archives)} recording(s) on {base_url}")
+    print(f"Start the server with: MTA_FEED_BASE_URL={base_url} python server.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        httpd.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
 import json
 import os
+import re
+
+from atomic_write import atomic_write_json
 
 def round_coords(coords, precision=5):
     """
@@ -14,7 +17,49 @@ def round_coords(coords, precision=5):
         return [round_coords(c, precision) for c in coords]
     return coords
 
+def optimize_data(data):
+    """Strips unused properties and rounds coordinates in place. Returns `data`."""
+    # Optimize Features (GeoJSON or Config structure)
+    features = []
+    if 'features' in data:
+        features = data['features']
+    elif 'shapes' in data and 'features' in data['shapes']:
+        features = data['shapes']['features']
+
+    for feature in features:
+        # 1. Strip Properties (But extract useful data first)
+        props = feature.get('properties', {})
+        desc = props.get('description', '')
+        
+        if desc:
+            # Extract Name
+            name_match = re.search(r'<span class="atr-name">NAME</span>:</strong> <span class="atr-value">([^<]+)</span>', desc)
+            if name_match:
+                props['name'] = name_match.group(1).strip()
+            
+            # Extract Line
+            line_match = re.search(r'<span class="atr-name">LINE</span>:</strong> <span class="atr-value">([^<]+)</span>', desc)
+            if line_match:
+                props['lines'] = line_match.group(1).strip()
+        
+        if 'description' in props:
+            del props['description']
+        
+        # Clean up other typically unused Socrata fields
+        for key in ['url', 'objectid', 'geo_id_ir', 'geometry_name']:
+            if key in props:
+                del props[key]
+
+        feature['properties'] = props
+
+        # 2. Round Coordinates
+        if 'geometry' in feature and feature['geometry']:
+            feature['geometry']['coordinates'] = round_coords(feature['geometry']['coordinates'], 5)
+
+    return data
+
 def optimize_json(filepath):
+    """Optimizes `filepath` in place. Raises on failure (the file is left untouched)."""
     print(f"Optimizing {filepath}...")
     try:
         with open(filepath, 'r') as f:
@@ -22,46 +67,8 @@ def optimize_json(filepath):
         
         initial_size = os.path.getsize(filepath)
         
-        # Optimize Features (GeoJSON or Config structure)
-        features = []
-        if 'features' in data:
-            features = data['features']
-        elif 'shapes' in data and 'features' in data['shapes']:
-            features = data['shapes']['features']
-
-        for feature in features:
-            # 1. Strip Properties (But extract useful data first)
-            props = feature.get('properties', {})
-            desc = props.get('description', '')
-            
-            if desc:
-                import re
-                # Extract Name
-                name_match = re.search(r'<span class="atr-name">NAME</span>:</strong> <span class="atr-value">([^<]+)</span>', desc)
-                if name_match:
-                    props['name'] = name_match.group(1).strip()
-                
-                # Extract Line
-                line_match = re.search(r'<span class="atr-name">LINE</span>:</strong> <span class="atr-value">([^<]+)</span>', desc)
-                if line_match:
-                    props['lines'] = line_match.group(1).strip()
-            
-            if 'description' in props:
-                del props['description']
-            
-            # Clean up other typically unused Socrata fields
-            for key in ['url', 'objectid', 'geo_id_ir', 'geometry_name']:
-                if key in props:
-                    del props[key]
-
-            feature['properties'] = props
-
-            # 2. Round Coordinates
-            if 'geometry' in feature and feature['geometry']:
-                feature['geometry']['coordinates'] = round_coords(feature['geometry']['coordinates'], 5)
-
-        with open(filepath, 'w') as f:
-            json.dump(data, f, separators=(',', ':')) # Minify whitespace
+        optimize_data(data)
+        atomic_write_json(filepath, data, separators=(',', ':')) # Minify whitespace
 
         final_size = os.path.getsize(filepath)
         reduction = (1 - (final_size / initial_size)) * 100
@@ -69,6 +76,7 @@ def optimize_json(filepath):
 
     except Exception as e:
         print(f"  Error optimizing {filepath}: {e}")
+        raise
 
 if __name__ == "__main__":
     files = [
@@ -77,8 +85,14 @@ if __name__ == "__main__":
         "data/subway_config.json"
     ]
     
+    failed = False
     for f in files:
         if os.path.exists(f):
-            optimize_json(f)
+            try:
+                optimize_json(f)
+            except Exception:
+                failed = True
         else:
             print(f"File not found: {f}")
+    if failed:
+        raise SystemExit(1)
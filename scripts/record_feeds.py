@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Share the feed list with the server so recordings always match what it polls
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from mta_feeds import FEED_PATHS, ALERTS_FEED_PATH, MTA_FEED_BASE_URL  # noqa: E402
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), '../data/recordings')
+STOPS_FILE = os.path.join(os.path.dirname(__file__), '../data/stops_coords.json')
+MANIFEST_NAME = "manifest.json"
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
+
+# Routes carried by each trip feed (used for synthetic recordings)
+FEED_ROUTES = {
+    "mtagtfsfeeds/nyct%2Fgtfs": ["1", "2", "3", "4", "5", "6", "GS"],
+    "mtagtfsfeeds/nyct%2Fgtfs-ace": ["A", "C", "E", "H", "FS"],
+    "mtagtfsfeeds/nyct%2Fgtfs-nqrw": ["N", "Q", "R", "W"],
+    "mtagtfsfeeds/nyct%2Fgtfs-bdfm": ["B", "D", "F", "M"],
+    "mtagtfsfeeds/nyct%2Fgtfs-l": ["L"],
+    "mtagtfsfeeds/nyct%2Fgtfs-g": ["G"],
+    "mtagtfsfeeds/nyct%2Fgtfs-jz": ["J", "Z"],
+    "mtagtfsfeeds/nyct%2Fgtfs-7": ["7"],
+    "mtagtfsfeeds/nyct%2Fgtfs-si": ["SI"],
+}
+
+
+def member_name(path):
+    """Zip member name for a feed path ('/' and '%' are not filename friendly)."""
+    return path.replace('/', '__').replace('%', '_') + ".pb"
+
+
+def fetch_raw(url, timeout=10):
+    """Returns (status, body, elapsed_ms). Network errors come back as status 0."""
+    start = time.perf_counter()
+    try:
+        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        body, status = b"", e.code
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+        body, status = b"", 0
+    return status, body, (time.perf_counter() - start) * 1000
+
+
+def write_recording(out_dir, recorded_at, feeds):
+    """
+    Writes one capture as a timestamped zip archive.
+    `feeds` maps feed path -> (status, body, elapsed_ms).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(recorded_at))
+    out_path = os.path.join(out_dir, f"feeds-{stamp}.zip")
+
+    manifest = {"recorded_at": recorded_at, "feeds": {}}
+    with zipfile.ZipFile(out_path, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        for path, (status, body, elapsed_ms) in feeds.items():
+            name = member_name(path)
+            manifest["feeds"][path] = {
+                "member": name,
+                "status": status,
+                "bytes": len(body),
+                "fetch_ms": round(elapsed_ms, 1)
+            }
+            if body:
+                z.writestr(name, body)
+        z.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    return out_path
+
+
+def load_recording(path):
+    """
+    Loads a recording archive.
+    Returns (recorded_at, {feed path: bytes or None}, manifest).
+    """
+    with zipfile.ZipFile(path) as z:
+        manifest = json.loads(z.read(MANIFEST_NAME))
+        names = set(z.namelist())
+        feeds = {}
+        for feed_path, info in manifest["feeds"].items():
+            feeds[feed_path] = z.read(info["member"]) if info["member"] in names else None
+    return manifest["recorded_at"], feeds, manifest
+
+
+def list_recordings(path):
+    """Returns recording archives under `path` (a file or a directory), oldest first."""
+    if os.path.isfile(path):
+        return [path]
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.startswith("feeds-") and name.endswith(".zip")
+    )
+
+
+def record_once(base_url, out_dir):
+    """
+    Captures all trip feeds plus the alerts feed in one archive. Feeds are
+    fetched in parallel so the capture is as close to one instant as the
+    slowest feed allows, like the server's own refresh.
+    """
+    paths = FEED_PATHS + [ALERTS_FEED_PATH]
+    recorded_at = time.time()
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        feeds = dict(zip(paths, executor.map(lambda path: fetch_raw(f"{base_url}/{path}"), paths)))
+    for path, (status, body, elapsed_ms) in feeds.items():
+        print(f"  {path}: HTTP {status}, {len(body)} bytes, {elapsed_ms:.0f} ms")
+    print(f"  Captured in {(time.time() - recorded_at) * 1000:.0f} ms")
+    return write_recording(out_dir, recorded_at, feeds)
+
+
+def synthesize_feeds(recorded_at, trips_per_route=20, stops_per_trip=25, seed=None):
+    """
+    Builds plausible GTFS-RT payloads without network access, so the replay
+    server and benchmarks can run on a fresh checkout.
+    """
+    from google.transit import gtfs_realtime_pb2
+
+    rng = random.Random(seed)
+    with open(STOPS_FILE, 'r', encoding='utf-8') as f:
+        parents = sorted(s for s in json.load(f) if s[-1] not in 'NS')
+
+    start_date = time.strftime('%Y%m%d', time.localtime(recorded_at))
+    feeds = {}
+    for path in FEED_PATHS:
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.header.gtfs_realtime_version = "1.0"
+        feed.header.timestamp = int(recorded_at)
+        for route_id in FEED_ROUTES.get(path, []):
+            for n in range(trips_per_route):
+                direction = rng.choice("NS")
+                origin = rng.randrange(0, 24 * 60 * 60)
+                trip_id = f"{origin // 36:06d}_{route_id}..{direction}"
+
+                entity = feed.entity.add()
+                entity.id = f"{route_id}-{n}"
+                tu = entity.trip_update
+                tu.trip.trip_id = trip_id
+                tu.trip.route_id = route_id
+                tu.trip.start_date = start_date
+                tu.trip.start_time = time.strftime('%H:%M:%S', time.gmtime(origin))
+
+                first = rng.randrange(0, max(1, len(parents) - stops_per_trip))
+                t = int(recorded_at) + rng.randrange(0, 300)
+                for stop in parents[first:first + rng.randrange(1, stops_per_trip + 1)]:
+                    stu = tu.stop_time_update.add()
+                    stu.stop_id = stop + direction
+                    stu.arrival.time = t
+                    stu.departure.time = t + 30
+                    t += rng.randrange(60, 180)
+
+                vp = feed.entity.add()
+                vp.id = f"{route_id}-{n}-vp"
+                vp.vehicle.trip.trip_id = trip_id
+                vp.vehicle.trip.route_id = route_id
+        feeds[path] = (200, feed.SerializeToString(), 0.0)
+
+    alerts = gtfs_realtime_pb2.FeedMessage()
+    alerts.header.gtfs_realtime_version = "1.0"
+    alerts.header.timestamp = int(recorded_at)
+    for n, route_id in enumerate(rng.sample(sorted(r for rs in FEED_ROUTES.values() for r in rs), 5)):
+        entity = alerts.entity.add()
+        entity.id = f"synthetic-alert-{n}"
+        entity.alert.header_text.translation.add().text = f"[{route_id}] Trains are running with delays"
+        entity.alert.description_text.translation.add().text = "Synthetic alert recorded for offline testing."
+        entity.alert.informed_entity.add().route_id = route_id
+    feeds[ALERTS_FEED_PATH] = (200, alerts.SerializeToString(), 0.0)
+    return feeds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record raw MTA GTFS-RT responses for offline replay")
+    parser.add_argument("--out", default=RECORDINGS_DIR, help="Directory for recording archives")
+    parser.add_argument("--base-url", default=MTA_FEED_BASE_URL, help="Upstream feed base URL")
+    parser.add_argument("--count", type=int, default=1, help="Number of captures to take")
+    parser.add_argument("--interval", type=float, default=30, help="Seconds between captures")
+    parser.add_argument("--synthetic", action="store_true", help="Generate synthetic feeds instead of fetching")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for --synthetic")
+    args = parser.parse_args()
+
+    for i in range(args.count):
+        if i:
+            time.sleep(0 if args.synthetic else args.interval)
+        if args.synthetic:
+            # Space synthetic captures out on the recorded timeline as if polled live
+            recorded_at = time.time() + i * args.interval
+            seed = None if args.seed is None else args.seed + i
+            out_path = write_recording(args.out, recorded_at, synthesize_feeds(recorded_at, seed=seed))
+        else:
+            print(f"Capture {i + 1}/{args.count} from {args.base_url}...")
+            out_path = record_once(args.base_url.rstrip('/'), args.out)
+        print(f"Wrote {out_path} ({os.path.getsize(out_path)} bytes).")
+
+
+if __name__ == '__main__':
+    main()
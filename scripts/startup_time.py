@@ -0,0 +1,86 @@
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from record_feeds import RECORDINGS_DIR, list_recordings
+from mock_mta import start_mock_server
+from loadtest import free_port, ROOT_DIR
+
+
+def poll(port, path, deadline, want_status=200):
+    """Polls until `path` returns want_status. Returns seconds of the first such byte, or None."""
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            conn.close()
+            if resp.status == want_status:
+                return time.perf_counter()
+        except OSError:
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def measure(env, timeout):
+    port = free_port()
+    env = dict(env, PORT=str(port))
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, 'server.py'], cwd=ROOT_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + timeout
+        first_byte = poll(port, '/api/health', deadline)
+        ready = poll(port, '/api/ready', deadline)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return (
+        (first_byte - start) * 1000 if first_byte else None,
+        (ready - start) * 1000 if ready else None
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server.py time-to-first-byte and time-to-ready")
+    parser.add_argument("--recordings", default=RECORDINGS_DIR, help="Recording archive or directory")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="WORKERS for the server under test")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for readiness")
+    args = parser.parse_args()
+
+    archives = list_recordings(args.recordings)
+    if not archives:
+        print("No recordings found. Run scripts/record_feeds.py (or --synthetic) first.")
+        sys.exit(1)
+    mock, base_url = start_mock_server(archives[-1:])
+    env = dict(os.environ, WORKERS=str(args.workers), ENV='production',
+               MTA_FEED_BASE_URL=base_url, RT_ARCHIVE_DIR='', GBFS_BASE_URL='')
+
+    ttfb, ready = [], []
+    for i in range(args.runs):
+        first_byte_ms, ready_ms = measure(env, args.timeout)
+        print(f"run {i + 1}: first byte {first_byte_ms or float('nan'):.0f} ms, "
+              f"ready {ready_ms or float('nan'):.0f} ms", flush=True)
+        if first_byte_ms:
+            ttfb.append(first_byte_ms)
+        if ready_ms:
+            ready.append(ready_ms)
+    mock.shutdown()
+
+    if ttfb:
+        print(f"time to first byte: median {statistics.median(ttfb):.0f} ms")
+    if ready:
+        print(f"time to ready:      median {statistics.median(ready):.0f} ms")
+    else:
+        print("server never reported ready (is data/subway_schedule.json present?)")
+
+
+if __name__ == '__main__':
+    main()
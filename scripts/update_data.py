@@ -1,13 +1,19 @@
+import urllib.error
 import urllib.request
 import zipfile
-import io
 import csv
 import json
 import os
 import time
 import argparse
+import sys
+import hashlib
 from collections import defaultdict
 
+from atomic_write import atomic_write_json, atomic_write_bytes
+from build_stops_json import build_stops_json, OUTPUT_FILE as STOPS_COORDS_FILE
+from optimize_geojson import optimize_data, optimize_json
+
 # --- Configuration ---
 DATA_DIR = "data"
 GTFS_DIR = os.path.join(DATA_DIR, "gtfs")
@@ -17,10 +23,18 @@ CACHE_FILE = os.path.join(DATA_DIR, "google_transit.zip")
 # Output Files
 CONFIG_FILE = os.path.join(DATA_DIR, "subway_config.json")
 SCHEDULE_FILE = os.path.join(DATA_DIR, "subway_schedule.json")
+GEOJSON_FILES = [
+    os.path.join(DATA_DIR, "nyc-neighborhoods.geojson"),
+    os.path.join(DATA_DIR, "subway-stations.geojson")
+]
+
+# Fingerprints of GTFS members and derived outputs from the last build
+MANIFEST_FILE = os.path.join(DATA_DIR, "build_manifest.json")
+# Bump when processing logic changes so every product is rebuilt once
+BUILD_VERSION = 2
 
 # Constants
 CACHE_DURATION = 3600  # 1 hour
-CACHE_DURATION = 3600  # 1 hour
 TARGET_SERVICES = ["Weekday", "Saturday", "Sunday"] # Process all common schedules
 
 def ensure_dirs():
@@ -29,35 +43,95 @@ def ensure_dirs():
     if not os.path.exists(GTFS_DIR):
         os.makedirs(GTFS_DIR)
 
-def download_gtfs(force=False):
-    """Downloads GTFS zip from MTA if not cached or forced."""
+def load_manifest():
+    if os.path.exists(MANIFEST_FILE):
+        try:
+            with open(MANIFEST_FILE, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            print("Build manifest unreadable, rebuilding everything.")
+    return {"download": {}, "members": {}, "products": {}}
+
+def file_hash(path):
+    """sha256 of a file on disk (used for outputs and for loose GTFS files)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def download_gtfs(manifest, force=False):
+    """
+    Downloads GTFS zip from MTA if not cached or forced.
+    Revalidates with ETag / Last-Modified so an unchanged feed isn't re-downloaded.
+    """
     ensure_dirs()
     
-    needs_download = True
     if os.path.exists(CACHE_FILE) and not force:
         mtime = os.path.getmtime(CACHE_FILE)
         if time.time() - mtime < CACHE_DURATION:
-            needs_download = False
             print("Using cached GTFS data.")
+            return
 
-    if needs_download:
-        print(f"Downloading GTFS data from {MTA_GTFS_URL}...")
-        try:
-            with urllib.request.urlopen(MTA_GTFS_URL) as response:
-                content = response.read()
-                with open(CACHE_FILE, 'wb') as out_file:
-                    out_file.write(content)
-            
-            # Extract to GTFS_DIR for schedule processing
-            print("Extracting GTFS data...")
-            with zipfile.ZipFile(io.BytesIO(content)) as z:
-                z.extractall(GTFS_DIR)
-                
-            print("Download and extraction complete.")
-        except Exception as e:
+    print(f"Downloading GTFS data from {MTA_GTFS_URL}...")
+    validators = manifest.get("download", {})
+    request = urllib.request.Request(MTA_GTFS_URL)
+    if os.path.exists(CACHE_FILE) and not force:
+        if validators.get("etag"):
+            request.add_header("If-None-Match", validators["etag"])
+        if validators.get("last_modified"):
+            request.add_header("If-Modified-Since", validators["last_modified"])
+    try:
+        with urllib.request.urlopen(request) as response:
+            content = response.read()
+            atomic_write_bytes(CACHE_FILE, content)
+            manifest["download"] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")
+            }
+        print("Download complete.")
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
             print(f"Error downloading GTFS data: {e}")
             if not os.path.exists(CACHE_FILE):
                 raise
+            return
+        print("GTFS feed not modified since last download.")
+        os.utime(CACHE_FILE)
+    except Exception as e:
+        print(f"Error downloading GTFS data: {e}")
+        if not os.path.exists(CACHE_FILE):
+            raise
+
+def fingerprint_members():
+    """
+    Returns {member name: fingerprint} for the GTFS tables.
+    Uses the CRC-32 and size from the zip's central directory, so nothing has
+    to be decompressed. Falls back to hashing already extracted files.
+    """
+    if os.path.exists(CACHE_FILE):
+        with zipfile.ZipFile(CACHE_FILE) as z:
+            return {i.filename: f"crc32:{i.CRC:08x}:{i.file_size}" for i in z.infolist() if not i.is_dir()}
+    if os.path.isdir(GTFS_DIR):
+        return {name: f"sha256:{file_hash(os.path.join(GTFS_DIR, name))}" for name in os.listdir(GTFS_DIR)}
+    return {}
+
+def extract_changed(members, manifest):
+    """Extracts only the zip members whose fingerprint changed (or that are missing on disk)."""
+    if not os.path.exists(CACHE_FILE):
+        return
+    previous = manifest.get("members", {})
+    changed = [
+        name for name, fp in members.items()
+        if previous.get(name) != fp or not os.path.exists(os.path.join(GTFS_DIR, name))
+    ]
+    if changed:
+        print(f"Extracting {len(changed)} changed GTFS files: {', '.join(sorted(changed))}")
+        with zipfile.ZipFile(CACHE_FILE) as z:
+            for name in changed:
+                z.extract(name, GTFS_DIR)
+    else:
+        print("No GTFS files changed.")
 
 def process_map_data():
     """Generates subway_config.json (Routes & Shapes)"""
@@ -135,8 +209,8 @@ def process_map_data():
         
         print(f"Processed {len(features)} track segments.")
         
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(subway_data, f)
+        optimize_data(subway_data)
+        atomic_write_json(CONFIG_FILE, subway_data, separators=(',', ':'))
         print(f"Saved map config to {CONFIG_FILE}")
 
     except Exception as e:
@@ -148,6 +222,14 @@ def parse_time(t_str):
     h, m, s = map(int, t_str.split(':'))
     return h * 3600 + m * 60 + s
 
+def normalize_trip_id(trip_id):
+    """
+    Shortens a GTFS trip ID to its last two '_' parts, the form used by the
+    GTFS-RT feeds. Done here so server.py doesn't rewrite every trip at startup.
+    """
+    parts = trip_id.split('_')
+    return "_".join(parts[-2:]) if len(parts) >= 2 else trip_id
+
 def process_schedule_data():
     """Generates subway_schedule.json (Stop Times)"""
     print(f"Processing Schedule Data (Services: {TARGET_SERVICES})...")
@@ -207,7 +289,7 @@ def process_schedule_data():
             continue
 
         routes[info['route']].append({
-            "tripId": tid,
+            "tripId": normalize_trip_id(tid),
             "dir": info['dir'],
             "serviceId": info['serviceId'],
             "stops": info['stops']
@@ -221,32 +303,129 @@ def process_schedule_data():
     print(f"Saving schedule to {SCHEDULE_FILE}...")
     output_data = {
         "routes": routes,
-        "stops": stops_loc
+        "stops": stops_loc,
+        "meta": {
+            "normalizedTripIds": True
+        }
     }
-    with open(SCHEDULE_FILE, 'w') as f:
-        json.dump(output_data, f)
+    atomic_write_json(SCHEDULE_FILE, output_data)
     
     print("Done!")
 
+def optimize_static_geojson():
+    for path in GEOJSON_FILES:
+        if os.path.exists(path):
+            optimize_json(path)
+
+# Derived outputs, the GTFS tables each depends on, and how to rebuild them.
+# Products without GTFS inputs are rebuilt only when their output changed on disk.
+PRODUCTS = {
+    "config": {
+        "inputs": ["routes.txt", "shapes.txt", "trips.txt"],
+        "outputs": [CONFIG_FILE],
+        "build": process_map_data
+    },
+    "schedule": {
+        "inputs": ["trips.txt", "stop_times.txt", "stops.txt"],
+        "outputs": [SCHEDULE_FILE],
+        "params": {"services": TARGET_SERVICES},
+        "build": process_schedule_data
+    },
+    "stops_coords": {
+        "inputs": ["stops.txt"],
+        "outputs": [STOPS_COORDS_FILE],
+        "build": build_stops_json
+    },
+    "geojson": {
+        "inputs": [],
+        "outputs": GEOJSON_FILES,
+        "build": optimize_static_geojson
+    }
+}
+
+def product_key(product, members):
+    """Everything that should trigger a rebuild when it changes."""
+    return {
+        "version": BUILD_VERSION,
+        "inputs": {name: members.get(name) for name in product["inputs"]},
+        "params": product.get("params", {})
+    }
+
+def outputs_intact(record, product):
+    """True if every output still matches the hash recorded when we built it."""
+    recorded = record.get("outputs", {})
+    for path in product["outputs"]:
+        key = os.path.relpath(path)
+        if not os.path.exists(path) or recorded.get(key) != file_hash(path):
+            return False
+    return True
+
+def build_products(manifest, members, selected, rebuild=False):
+    """Rebuilds stale products. Returns the names of products whose build failed."""
+    failed = []
+    for name in selected:
+        product = PRODUCTS[name]
+        missing = [i for i in product["inputs"] if i not in members]
+        if missing:
+            print(f"[{name}] Skipping, GTFS files missing: {', '.join(missing)}")
+            continue
+
+        key = product_key(product, members)
+        record = manifest["products"].get(name)
+        if not rebuild and record and record.get("key") == key and outputs_intact(record, product):
+            print(f"[{name}] Up to date.")
+            continue
+
+        print(f"[{name}] Rebuilding...")
+        started = time.time()
+        try:
+            product["build"]()
+        except Exception as e:
+            # Leave the manifest record alone so the next run retries this product
+            print(f"[{name}] Build failed: {e}")
+            failed.append(name)
+            continue
+        manifest["products"][name] = {
+            "key": key,
+            "outputs": {os.path.relpath(p): file_hash(p) for p in product["outputs"] if os.path.exists(p)},
+            "built_at": time.time(),
+            "seconds": round(time.time() - started, 2)
+        }
+        # Save after each product so an interrupted run keeps its progress
+        atomic_write_json(MANIFEST_FILE, manifest, indent=2)
+    return failed
+
 def main():
     parser = argparse.ArgumentParser(description="Update NYC Subway Data")
     parser.add_argument("--force", action="store_true", help="Force re-download of GTFS data")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild outputs even if their inputs are unchanged")
     parser.add_argument("--skip-download", action="store_true", help="Skip download, process existing data only")
     parser.add_argument("--map-only", action="store_true", help="Only process map geometry (routes/shapes)")
     parser.add_argument("--schedule-only", action="store_true", help="Only process schedule (timetables)")
     args = parser.parse_args()
 
-    # Default to running both if no specific flag is set
-    run_all = not (args.map_only or args.schedule_only)
+    # Default to running everything if no specific flag is set
+    selected = []
+    if args.map_only:
+        selected.append("config")
+    if args.schedule_only:
+        selected.append("schedule")
+    if not selected:
+        selected = list(PRODUCTS)
 
+    ensure_dirs()
+    manifest = load_manifest()
     if not args.skip_download:
-        download_gtfs(force=args.force)
+        download_gtfs(manifest, force=args.force)
     
-    if run_all or args.map_only:
-        process_map_data()
-        
-    if run_all or args.schedule_only:
-        process_schedule_data()
+    members = fingerprint_members()
+    extract_changed(members, manifest)
+    manifest["members"] = members
+    failed = build_products(manifest, members, selected, rebuild=args.rebuild)
+    atomic_write_json(MANIFEST_FILE, manifest, indent=2)
+    if failed:
+        print(f"Failed to build: {', '.join(failed)}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
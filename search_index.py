@@ -0,0 +1,242 @@
+"""
+Station search index for /api/search.
+
+Built once from subway-stations.geojson plus the schedule's `stops` (which
+supply GTFS stop IDs and the official names as aliases). Names are
+normalized into tokens ("W 4th St - Washington Sq" -> w 4 st washington sq,
+with "street"/"avenue"/... folded to the same abbreviations), then indexed two ways:
+- a prefix trie over tokens: every query token must prefix-match a token of the name
+- a trigram index over the whole name: fuzzy fallback for typos
+
+Results are ranked by match quality, then by the number of routes serving
+the station (the best popularity signal in the data we have). Answers for
+hot queries are memoized in a small LRU.
+"""
+import math
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+MAX_RESULTS = 10
+LRU_SIZE = 1024
+BUNDLE_METERS = 300       # same-name entrances closer than this are one station
+MATCH_DEGREES = 0.003     # max distance to attach a GTFS stop ID (as src/stations.js does)
+FUZZY_MIN_SIMILARITY = 0.3
+
+# Folded to one spelling on both the index and the query side
+ABBREVIATIONS = {
+    "street": "st", "sts": "st", "streets": "st",
+    "avenue": "av", "ave": "av", "avenues": "av", "aves": "av",
+    "boulevard": "blvd", "parkway": "pkwy", "place": "pl", "road": "rd",
+    "square": "sq", "heights": "hts", "center": "ctr", "centre": "ctr",
+    "junction": "jct", "plaza": "plz", "terminal": "term", "station": "sta",
+    "east": "e", "west": "w", "north": "n", "south": "s",
+    "fort": "ft", "mount": "mt", "beach": "bch", "park": "pk",
+    "university": "univ", "college": "coll", "and": "&"
+}
+# Long forms are also put in the trie so a half-typed "stre" still finds "St"
+EXPANSIONS = defaultdict(list)
+for _long, _short in ABBREVIATIONS.items():
+    EXPANSIONS[_short].append(_long)
+ORDINAL = re.compile(r'^(\d+)(st|nd|rd|th|s|n|r|t)$')
+TOKEN = re.compile(r'[a-z0-9&]+')
+ROUTE_FILTER = re.compile(r'\b(?:route|line):(\w+)', re.IGNORECASE)
+
+
+def normalize_tokens(text):
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        ordinal = ORDINAL.match(token)
+        if ordinal:
+            token = ordinal.group(1)
+        tokens.append(ABBREVIATIONS.get(token, token))
+    return tokens
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _meters(lat1, lon1, lat2, lon2):
+    dy = (lat1 - lat2) * 111320
+    dx = (lon1 - lon2) * 111320 * math.cos(math.radians(lat1))
+    return math.hypot(dx, dy)
+
+
+class TrieNode:
+    __slots__ = ("children", "postings")
+
+    def __init__(self):
+        self.children = {}
+        self.postings = set()  # station indexes with a token under this prefix
+
+
+class StationSearchIndex:
+    def __init__(self, stations):
+        """stations: [{"id", "name", "routes", "lat", "lon", "aliases"}]"""
+        self.stations = stations
+        self.root = TrieNode()
+        self.exact = defaultdict(set)     # token -> station indexes
+        self.grams = defaultdict(set)     # trigram -> (station idx, name idx)
+        self.names = []                   # station idx -> [normalized name strings]
+        self.gram_counts = {}             # (station idx, name idx) -> number of trigrams
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.hits = self.misses = 0
+
+        for idx, station in enumerate(stations):
+            names = []
+            for name in [station["name"]] + station.get("aliases", []):
+                tokens = normalize_tokens(name)
+                if not tokens:
+                    continue
+                names.append(" ".join(tokens))
+                for token in tokens:
+                    self.exact[token].add(idx)
+                    for form in [token] + EXPANSIONS.get(token, []):
+                        self._insert(form, idx)
+            self.names.append(names)
+            for name_idx, name in enumerate(names):
+                grams = trigrams(name)
+                self.gram_counts[(idx, name_idx)] = len(grams)
+                for gram in grams:
+                    self.grams[gram].add((idx, name_idx))
+
+    @classmethod
+    def build(cls, geojson, stops=None):
+        """
+        Groups geojson station entrances into stations and attaches GTFS IDs and
+        official names from `stops` ({id: [lat, lon, name?]}, parent IDs only).
+        """
+        parents = {sid: s for sid, s in (stops or {}).items() if len(sid) <= 3}
+        stations = []
+        for feature in geojson.get("features", []):
+            coords = (feature.get("geometry") or {}).get("coordinates")
+            props = feature.get("properties") or {}
+            if not coords or not props.get("name"):
+                continue
+            lon, lat = coords[0], coords[1]
+            routes = []
+            for r in re.split(r'[-\s]+', props.get("lines", "")):
+                if r and r != "Express" and r not in routes:
+                    routes.append(r)
+            for station in stations:
+                if station["name"] == props["name"] and _meters(lat, lon, station["lat"], station["lon"]) < BUNDLE_METERS:
+                    station["routes"].extend(r for r in routes if r not in station["routes"])
+                    break
+            else:
+                stations.append({"id": None, "name": props["name"], "routes": routes,
+                                 "lat": lat, "lon": lon, "aliases": []})
+
+        for station in stations:
+            best, best_d = None, MATCH_DEGREES ** 2
+            for sid, stop in parents.items():
+                d = (station["lat"] - stop[0]) ** 2 + (station["lon"] - stop[1]) ** 2
+                if d < best_d:
+                    best, best_d = sid, d
+            if best is not None:
+                station["id"] = best
+                name = parents[best][2] if len(parents[best]) > 2 else None
+                if name and name != station["name"]:
+                    station["aliases"].append(name)
+        return cls(stations)
+
+    def _insert(self, token, idx):
+        node = self.root
+        for ch in token:
+            node = node.children.setdefault(ch, TrieNode())
+            node.postings.add(idx)
+
+    def _prefix(self, token):
+        node = self.root
+        for ch in token:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.postings
+
+    def _prefix_matches(self, tokens):
+        """Stations where every query token prefixes some name token, scored by how exactly."""
+        candidates = None
+        for token in tokens:
+            postings = self._prefix(token)
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                return {}
+        scored = {}
+        query = " ".join(tokens)
+        for idx in candidates:
+            exact = sum(1 for t in tokens if idx in self.exact.get(t, ()))
+            score = 40 + 40 * exact / len(tokens)
+            if any(name == query for name in self.names[idx]):
+                score += 30
+            elif any(name.startswith(query) for name in self.names[idx]):
+                score += 15
+            scored[idx] = score
+        return scored
+
+    def _fuzzy_matches(self, tokens):
+        """Trigram (Dice) similarity against every indexed name."""
+        query_grams = trigrams(" ".join(tokens))
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for key in self.grams.get(gram, ()):
+                shared[key] += 1
+        scored = {}
+        for key, count in shared.items():
+            idx = key[0]
+            similarity = 2 * count / (len(query_grams) + self.gram_counts[key])
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored[idx] = max(scored.get(idx, 0), 40 * similarity)
+        return scored
+
+    def search(self, query, route=None, limit=MAX_RESULTS):
+        """Returns up to `limit` station dicts with a "score". `route:X` in the query filters by route."""
+        inline = ROUTE_FILTER.search(query)
+        if inline:
+            route = route or inline.group(1)
+            query = ROUTE_FILTER.sub(" ", query)
+        tokens = normalize_tokens(query)
+        route = route.upper() if route else None
+        key = (" ".join(tokens), route, limit)
+
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+
+        if tokens:
+            scored = self._prefix_matches(tokens)
+            if len(scored) < limit:
+                for idx, score in self._fuzzy_matches(tokens).items():
+                    scored.setdefault(idx, score)
+        else:
+            scored = {idx: 0 for idx in range(len(self.stations))} if route else {}
+
+        results = []
+        for idx, score in scored.items():
+            station = self.stations[idx]
+            if route and route not in station["routes"]:
+                continue
+            # Route count breaks ties between equally good matches (hubs first)
+            results.append((score + math.log1p(len(station["routes"])), idx))
+        results.sort(key=lambda r: (-r[0], self.stations[r[1]]["name"]))
+        answer = [
+            {"id": self.stations[idx]["id"], "name": self.stations[idx]["name"],
+             "routes": self.stations[idx]["routes"], "lat": self.stations[idx]["lat"],
+             "lon": self.stations[idx]["lon"], "score": round(score, 2)}
+            for score, idx in results[:limit]
+        ]
+
+        with self.cache_lock:
+            self.cache[key] = answer
+            if len(self.cache) > LRU_SIZE:
+                self.cache.popitem(last=False)
+        return answer
+
+    def stats(self):
+        return {"stations": len(self.stations), "trigrams": len(self.grams),
+                "cached": len(self.cache), "hits": self.hits, "misses": self.misses}
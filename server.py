@@ -1,18 +1,27 @@
 import http.server
 import socketserver
 import json
+import math
 import os
 import random
 import gzip
-from urllib.parse import urlparse
+import zlib
+import hashlib
+import hmac
+import struct
+from urllib.parse import urlparse, parse_qs
 import datetime
-import requests
-from google.transit import gtfs_realtime_pb2
 import time
 import sys
 import threading
+import signal
+import tempfile
 from threading import Lock
 from concurrent.futures import ThreadPoolExecutor
+from mta_feeds import MTA_FEED_BASE_URL, ALERTS_FEED_PATH, FEED_PATHS
+from wire_format import COMPACT_MEDIA_TYPE, wants_compact, encode_realtime, encode_schedule
+from rt_stats import ServiceStats, without_route_data
+from profiling import Profiler
 
 class Tee:
     def __init__(self, *files):
@@ -45,22 +54,96 @@ DATA_FILE = "data/subway_config.json"
 SCHEDULE_FILE = "data/subway_schedule.json"
 ENV = os.environ.get('ENV', 'development')
 
-MTA_ALERTS_URL = "https://api-endpoint.mta.info/Dataservice/mtagtfsfeed_id=c"
+MTA_ALERTS_URL = os.environ.get('MTA_ALERTS_URL', f"{MTA_FEED_BASE_URL}/{ALERTS_FEED_PATH}")
+
 ALERTS_CACHE = {
     "data": [],
     "last_updated": 0
 }
+alerts_lock = Lock()
+
+# Populated in the background by load_schedule()
+SCHEDULE_CACHE = {}
+SCHEDULE_STATE = "loading"  # loading | ready | failed
+STARTED_AT = time.time()
+
+# Filtered /api/schedule responses, rebuilt once per bucket
+SCHEDULE_BUCKET_SECONDS = 60
+SCHEDULE_RESPONSE = {"key": None, "payloads": None}
+SCHEDULE_RESPONSE_LOCK = Lock()
+# Pre-fork poller: what publish_schedule() last wrote to the store
+SCHEDULE_PUBLISHED = {"key": None, "state": None}
+SCHEDULE_PUBLISH_LOCK = Lock()
+
+# /api/bootstrap: everything first paint needs, in the order the client uses it
+BOOTSTRAP_FILES = [
+    ("config", DATA_FILE),
+    ("stations", "data/subway-stations.geojson"),
+    ("neighborhoods", "data/nyc-neighborhoods.geojson"),
+    ("stopsCoords", "data/stops_coords.json")
+]
+BOOTSTRAP_CACHE = {"version": None, "static": None, "schedule": None, "bundle": None}
+BOOTSTRAP_LOCK = Lock()
 
 # --- Realtime Cache ---
 RT_CACHE = {
     "data": None,
-    "last_updated": 0
+    "last_updated": 0,
+    "payloads": None  # {"json": bytes, "compact": bytes}, encoded once per refresh
 }
 RT_LOCK = Lock()
 
+# --- Realtime History ---
+# Snapshots are archived off the request path; set RT_ARCHIVE_DIR="" to disable.
+RT_ARCHIVE_DIR = os.environ.get('RT_ARCHIVE_DIR', 'data/archive')
+RT_ARCHIVE_RETENTION_HOURS = float(os.environ.get('RT_ARCHIVE_RETENTION_HOURS', 24))
+RT_ARCHIVE = None  # SnapshotArchive, started in __main__
+
+# --- Service Analytics ---
+# Per-route delay/headway histograms, folded in incrementally after every refresh
+STATS = ServiceStats()
+
+# --- Profiling ---
+# Sampled cProfile of GET requests plus stage timers, both off unless enabled
+# here or at runtime via POST /api/admin/profile (see profiling.py).
+PROFILER = Profiler(
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    timers=os.environ.get('PROFILE_TIMERS', '0') not in ('', '0')
+)
+# Admin endpoints need this token (X-Admin-Token header) and are disabled without one.
+# Loopback is not trusted: behind a same-host proxy every request comes from 127.0.0.1.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# --- Pre-fork Mode ---
+# WORKERS > 1 forks N processes accepting on one socket plus a single poller
+# process. The poller publishes pre-serialized snapshots to SNAPSHOT_DIR, which
+# workers mmap and serve as-is.
+WORKERS = int(os.environ.get('WORKERS', 1))
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), f"nycmetro-{PORT}"
+)
+RT_REFRESH_SECONDS = 30
+ALERTS_REFRESH_SECONDS = 60
+SNAPSHOTS = None  # SnapshotStore, set in pre-fork workers
+
+# --- Station Search ---
+STATIONS_FILE = "data/subway-stations.geojson"
+STOPS_COORDS_FILE = "data/stops_coords.json"
+SEARCH_INDEX = None  # StationSearchIndex, built right after the schedule loads
+SEARCH_MAX_LIMIT = 50
+
+# --- Citi Bike ---
+# GBFS is proxied server-side (merged, cached, delta-updatable); set GBFS_BASE_URL="" to disable.
+# Point it at scripts/mock_gbfs.py to run offline.
+GBFS_BASE_URL = os.environ.get('GBFS_BASE_URL', "https://gbfs.citibikenyc.com/gbfs/en").rstrip('/')
+GBFS = None  # GbfsProxy; refreshed in-process, or loaded from the poller's snapshot in pre-fork workers
+
 def fetch_alerts_feed():
     """Fetches the MTA GTFS-Realtime Alerts Feed once."""
     global ALERTS_CACHE
+    # Deferred so startup doesn't pay for requests/protobuf before the port is bound
+    import requests
+    from google.transit import gtfs_realtime_pb2
     try:
         print("[Alerts] Fetching feed...", flush=True)
         headers = {
@@ -108,27 +191,13 @@ def fetch_alerts_feed():
     
     return None
 
-def fetch_realtime_feed():
-    """Fetches and parses GTFS-RT feed from MTA in parallel."""
-    FEED_URLS = [
-        "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs",      # 1-7
-        "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-ace",  # A/C/E
-        "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-nqrw", # N/Q/R/W
-        "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-bdfm", # B/D/F/M
-        "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-l",    # L
-        "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-g",    # G
-        "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-jz",   # J/Z
-        "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-7",    # 7
-        "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-si"    # SIR
-    ]
-    
+def fetch_feed_contents(urls):
+    """Fetches raw GTFS-RT payloads in parallel. Failed feeds come back as None."""
+    import requests
     headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
     }
-    
-    trips = []
-    collected_alerts = []
-    
+
     def fetch_one(url):
         try:
             resp = requests.get(url, headers=headers, timeout=5)
@@ -138,20 +207,27 @@ def fetch_realtime_feed():
             print(f"Error fetching feed {url}: {e}")
         return None
 
-    # Fetch all in parallel
-    print(f"Fetching {len(FEED_URLS)} feeds in parallel...", flush=True)
-    with ThreadPoolExecutor(max_workers=len(FEED_URLS)) as executor:
-        contents = list(executor.map(fetch_one, FEED_URLS))
+    print(f"Fetching {len(urls)} feeds in parallel...", flush=True)
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        contents = list(executor.map(fetch_one, urls))
 
     success_count = sum(1 for c in contents if c)
     print(f"Fetched {success_count} feeds successfully.", flush=True)
+    return contents
 
-    for url, content in zip(FEED_URLS, contents):
+def parse_realtime_contents(urls, contents):
+    """Parses raw GTFS-RT payloads into the trip list served by /api/realtime."""
+    from google.transit import gtfs_realtime_pb2
+    trips = []
+    collected_alerts = []
+
+    for url, content in zip(urls, contents):
         if not content: continue
         
         try:
             feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(content)
+            with PROFILER.timer('realtime.parse'):
+                feed.ParseFromString(content)
             
             # Use global to limit log spam
             global logged_count_per_feed
@@ -163,57 +239,55 @@ def fetch_realtime_feed():
             feed_stats = {"tu": 0, "vp": 0}
             irt_counts = {str(i): 0 for i in range(1, 8)} # 1-7
 
-            for entity in feed.entity:
-                if entity.HasField('alert'):
-                     # ... (keep alert logic) ...
-                    alert = entity.alert
-                    header_text = alert.header_text.translation[0].text if alert.header_text.translation else "Alert"
-                    desc_text = alert.description_text.translation[0].text if alert.description_text.translation else ""
-                    affected_routes = [sel.route_id for sel in alert.informed_entity if sel.route_id]
+            with PROFILER.timer('realtime.extract'):
+                for entity in feed.entity:
+                    if entity.HasField('alert'):
+                         # ... (keep alert logic) ...
+                        alert = entity.alert
+                        header_text = alert.header_text.translation[0].text if alert.header_text.translation else "Alert"
+                        desc_text = alert.description_text.translation[0].text if alert.description_text.translation else ""
+                        affected_routes = [sel.route_id for sel in alert.informed_entity if sel.route_id]
                     
-                    collected_alerts.append({
-                        "id": entity.id,
-                        "header": header_text,
-                        "description": desc_text,
-                        "routes": list(set(affected_routes))
-                    })
+                        collected_alerts.append({
+                            "id": entity.id,
+                            "header": header_text,
+                            "description": desc_text,
+                            "routes": list(set(affected_routes))
+                        })
 
-                if entity.HasField('trip_update'):
-                    feed_stats["tu"] += 1
-                    tu = entity.trip_update
+                    if entity.HasField('trip_update'):
+                        feed_stats["tu"] += 1
+                        tu = entity.trip_update
                     
-                    rid = tu.trip.route_id
-                    if rid in irt_counts:
-                        irt_counts[rid] += 1
+                        rid = tu.trip.route_id
+                        if rid in irt_counts:
+                            irt_counts[rid] += 1
+                        
+                        if tu.stop_time_update:
+                            stu_list = []
+                            for stu in tu.stop_time_update:
+                                stu_list.append({
+                                    "stopId": stu.stop_id,
+                                    "arrival": {"time": stu.arrival.time} if stu.HasField("arrival") else None,
+                                    "departure": {"time": stu.departure.time} if stu.HasField("departure") else None
+                                })
                         
-                    if tu.stop_time_update:
-                        stu_list = []
-                        for stu in tu.stop_time_update:
-                            stu_list.append({
+                            # Use the first one for the summary fields (backward compat if needed)
+                            stu = tu.stop_time_update[0]
+                            trips.append({
+                                "tripId": tu.trip.trip_id,
+                                "routeId": tu.trip.route_id,
+                                "startTime": tu.trip.start_time,
+                                "startDate": tu.trip.start_date,
                                 "stopId": stu.stop_id,
-                                "arrival": {"time": stu.arrival.time} if stu.HasField("arrival") else None,
-                                "departure": {"time": stu.departure.time} if stu.HasField("departure") else None
+                                "status": "STOPPED_AT" if not stu.arrival.time else "IN_TRANSIT_TO",
+                                "time": stu.arrival.time or stu.departure.time,
+                                "stopTimeUpdate": stu_list
                             })
-                        
-                        # Use the first one for the summary fields (backward compat if needed)
-                        stu = tu.stop_time_update[0]
-                        trips.append({
-                            "tripId": tu.trip.trip_id,
-                            "routeId": tu.trip.route_id,
-                            "startTime": tu.trip.start_time,
-                            "startDate": tu.trip.start_date,
-                            "stopId": stu.stop_id,
-                            "status": "STOPPED_AT" if not stu.arrival.time else "IN_TRANSIT_TO",
-                            "time": stu.arrival.time or stu.departure.time,
-                            "stopTimeUpdate": stu_list
-                        })
-                elif entity.HasField('vehicle'):
-                    feed_stats["vp"] += 1
+                    elif entity.HasField('vehicle'):
+                        feed_stats["vp"] += 1
 
-            if "gtfs" in feed_name and "ace" not in feed_name and "nqrw" not in feed_name and "bdfm" not in feed_name and "l" not in feed_name and "g" not in feed_name:
-                 print(f"Feed {feed_name}: {len(feed.entity)} entities (TU: {feed_stats['tu']}, VP: {feed_stats['vp']})", flush=True)
-            else:
-                 print(f"Feed {feed_name}: {len(feed.entity)} entities (TU: {feed_stats['tu']}, VP: {feed_stats['vp']})", flush=True)
+            print(f"Feed {feed_name}: {len(feed.entity)} entities (TU: {feed_stats['tu']}, VP: {feed_stats['vp']})", flush=True)
         except Exception as e:
             print(f"Error parsing feed content: {e}", flush=True)
 
@@ -228,6 +302,369 @@ def fetch_realtime_feed():
             
     return trips
 
+def fetch_realtime_feed():
+    """Fetches and parses GTFS-RT feed from MTA in parallel."""
+    feed_urls = [f"{MTA_FEED_BASE_URL}/{path}" for path in FEED_PATHS]
+    with PROFILER.timer('realtime.fetch'):
+        contents = fetch_feed_contents(feed_urls)
+    return parse_realtime_contents(feed_urls, contents)
+
+def encode_realtime_payloads(updated, trips):
+    """Serializes a realtime snapshot in every supported wire format."""
+    with PROFILER.timer('realtime.serialize'):
+        return {
+            "json": json.dumps({"updated": updated, "trips": trips}).encode('utf-8'),
+            "compact": encode_realtime(updated, trips)
+        }
+
+def set_realtime_snapshot(updated, trips):
+    RT_CACHE['payloads'] = encode_realtime_payloads(updated, trips)
+    RT_CACHE['data'] = trips
+    RT_CACHE['last_updated'] = updated
+
+def update_stats(updated, trips):
+    """Feeds a fresh snapshot to the analytics stage; only changed trips cost anything."""
+    try:
+        service, _ = schedule_window()
+        started = time.perf_counter()
+        changed = STATS.update(updated, trips, SCHEDULE_CACHE, service)
+        print(f"[Stats] {changed} of {len(trips)} trips changed ({(time.perf_counter() - started) * 1000:.1f}ms)", flush=True)
+    except Exception as e:
+        print(f"[Stats] Update failed: {e}", flush=True)
+
+def refresh_realtime_if_stale():
+    """On-demand realtime refresh (30s TTL) used in single-process mode."""
+    now_ts = datetime.datetime.now().timestamp()
+    
+    with RT_LOCK:
+        if not RT_CACHE['data'] or (now_ts - RT_CACHE['last_updated'] > RT_REFRESH_SECONDS):
+            print(f"Refreshing Realtime Data... (Cached: {bool(RT_CACHE['data'])}, Age: {now_ts - RT_CACHE['last_updated']:.1f}s)", flush=True)
+            try:
+                new_data = fetch_realtime_feed()
+                # Only update if we got *some* data (simple safety)
+                if new_data: 
+                    set_realtime_snapshot(now_ts, new_data)
+                    update_stats(now_ts, new_data)
+                    if RT_ARCHIVE:
+                        RT_ARCHIVE.append(now_ts, new_data)
+            except Exception as e:
+                print(f"Global RT Fetch Error: {e}", flush=True)
+
+def normalize_trip_ids(schedule):
+    """Shortens GTFS trip IDs to the '<origin>_<route..dir>' form used by the RT feeds."""
+    count = 0
+    for rid, trips in schedule.get('routes', {}).items():
+        for trip in trips:
+            original = trip.get('tripId', "")
+            parts = original.split('_')
+            if len(parts) >= 2:
+                trip['tripId'] = "_".join(parts[-2:])
+                count += 1
+    return count
+
+def load_schedule(index_stations=True):
+    """
+    Loads SCHEDULE_FILE. Runs on a background thread so the port binds immediately.
+    The pre-fork poller passes index_stations=False: it serves no searches.
+    """
+    global SCHEDULE_CACHE, SCHEDULE_STATE
+    started = time.time()
+    try:
+        with open(SCHEDULE_FILE, 'r') as f:
+            schedule = json.load(f)
+        
+        # Files built by scripts/update_data.py are already normalized
+        if not schedule.get('meta', {}).get('normalizedTripIds'):
+            print("Normalizing Trip IDs...")
+            count = normalize_trip_ids(schedule)
+            print(f"Normalized {count} IDs (rebuild with scripts/update_data.py to skip this).")
+
+        SCHEDULE_CACHE = schedule
+        SCHEDULE_STATE = "ready"
+        print(f"Schedule loaded in {time.time() - started:.2f}s.", flush=True)
+
+    except Exception as e:
+        SCHEDULE_STATE = "failed"
+        print(f"Failed to load schedule: {e}", flush=True)
+
+    if index_stations:
+        build_search_index()
+
+def build_search_index(stops=None):
+    """Indexes station names. Uses the schedule's stops for GTFS IDs/names, or stops_coords.json without one."""
+    global SEARCH_INDEX
+    from search_index import StationSearchIndex
+    started = time.time()
+    try:
+        with open(STATIONS_FILE, 'r') as f:
+            geojson = json.load(f)
+        stops = stops or SCHEDULE_CACHE.get('stops')
+        if not stops and os.path.exists(STOPS_COORDS_FILE):
+            with open(STOPS_COORDS_FILE, 'r') as f:
+                stops = json.load(f)
+        SEARCH_INDEX = StationSearchIndex.build(geojson, stops)
+        print(f"[Search] Indexed {len(SEARCH_INDEX.stations)} stations in {time.time() - started:.2f}s.", flush=True)
+    except Exception as e:
+        print(f"[Search] Failed to build index: {e}", flush=True)
+
+def schedule_window(now=None):
+    """Returns (target_service, bucket) for the current NYC time."""
+    # Calculate time window using NYC time
+    try:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo("America/New_York")
+    except ImportError:
+        # Fallback for older python (though 3.11 is used)
+        # Simple offset for EST/EDT (imperfect but better than UTC)
+        tz = datetime.timezone(datetime.timedelta(hours=-4))
+    
+    now = now or datetime.datetime.now(tz)
+    # Midnight for today in NYC
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    seconds_since_midnight = (now - midnight).total_seconds()
+    
+    # Determine Service ID based on NYC Time
+    dow = now.weekday() # 0=Mon, 5=Sat, 6=Sun
+    if dow == 5:
+        target_service = "Saturday"
+    elif dow == 6:
+        target_service = "Sunday"
+    else:
+        target_service = "Weekday"
+
+    # Responses are shared by every request in the same bucket
+    bucket = int(seconds_since_midnight // SCHEDULE_BUCKET_SECONDS * SCHEDULE_BUCKET_SECONDS)
+    return target_service, bucket
+
+def build_schedule_response(target_service, seconds_since_midnight):
+    # Window logic
+    start_window = seconds_since_midnight - 600 # 10 mins buffer
+    end_window = seconds_since_midnight + (2 * 3600) # 2 hours ahead
+
+    # Handle wraparound for late night (if near 24h, schedule might go > 86400)
+    # For simplicity, we just filter. Ideally we handle day overlap.
+    
+    print(f"Loading Schedule for {target_service}", flush=True)
+
+    filtered_routes = {}
+    active_trips_count = 0
+    
+    # Filter Routes
+    for route_id, trips in SCHEDULE_CACHE.get('routes', {}).items():
+        filtered_trips = []
+        for trip in trips:
+            # Check Service ID
+            if trip.get('serviceId') != target_service:
+                continue
+
+            stops = trip.get('stops', [])
+            if not stops: continue
+            
+            start_time = stops[0]['time']
+            end_time = stops[-1]['time']
+            
+            # Check overlap: Trip starts before window ends AND trip ends after window starts
+            if start_time <= end_window and end_time >= start_window:
+                filtered_trips.append(trip)
+        
+        if filtered_trips:
+            filtered_routes[route_id] = filtered_trips
+            active_trips_count += len(filtered_trips)
+    
+    print(f"Server returning {active_trips_count} trips.", flush=True)
+    
+    return {
+        'routes': filtered_routes,
+        'stops': SCHEDULE_CACHE.get('stops', {}),
+        'meta': {
+            'window_start': start_window,
+            'window_end': end_window,
+            'total_trips': active_trips_count
+        }
+    }
+
+def schedule_payloads():
+    """
+    Returns {"json": bytes, "compact": bytes} for the current schedule bucket.
+    Both are built once per bucket and reused by every request in it.
+    """
+    key = schedule_window() + (id(SCHEDULE_CACHE),)
+    with SCHEDULE_RESPONSE_LOCK:
+        if SCHEDULE_RESPONSE['key'] != key:
+            with PROFILER.timer('schedule.build'):
+                response = build_schedule_response(key[0], key[1])
+            with PROFILER.timer('schedule.serialize'):
+                SCHEDULE_RESPONSE['payloads'] = {
+                    "json": json.dumps(response).encode('utf-8'),
+                    "compact": encode_schedule(response)
+                }
+            SCHEDULE_RESPONSE['key'] = key
+        return SCHEDULE_RESPONSE['payloads']
+
+def publish_schedule(store):
+    """
+    Pre-fork poller: publishes the current bucket's schedule bodies, plus the
+    stops for the workers' search index, so workers never load the schedule.
+    Then publishes the load state, which workers read instead of SCHEDULE_STATE.
+    """
+    with SCHEDULE_PUBLISH_LOCK:
+        key = schedule_window() + (id(SCHEDULE_CACHE),)
+        if SCHEDULE_STATE == "ready" and SCHEDULE_PUBLISHED['key'] != key:
+            payloads = schedule_payloads()
+            now = time.time()
+            store.publish('schedule', now, payloads['json'])
+            store.publish('schedule.compact', now, payloads['compact'])
+            if SCHEDULE_PUBLISHED['key'] is None or SCHEDULE_PUBLISHED['key'][2] != key[2]:
+                store.publish('schedule.stops', now, json.dumps(SCHEDULE_CACHE.get('stops', {})).encode('utf-8'))
+            SCHEDULE_PUBLISHED['key'] = key
+        if SCHEDULE_PUBLISHED['state'] != SCHEDULE_STATE:
+            store.publish('schedule.state', time.time(), SCHEDULE_STATE.encode('utf-8'))
+            SCHEDULE_PUBLISHED['state'] = SCHEDULE_STATE
+
+def schedule_state():
+    """SCHEDULE_STATE, or in pre-fork workers the state the poller last published."""
+    if SNAPSHOTS is None:
+        return SCHEDULE_STATE
+    snapshot = SNAPSHOTS.get('schedule.state')
+    return bytes(snapshot.body).decode('utf-8') if snapshot is not None else "loading"
+
+def schedule_compact():
+    """
+    Returns (source, compact schedule bytes) for the current bucket. Pre-fork
+    workers read the poller's snapshot; `source` changes whenever the body does.
+    """
+    if SNAPSHOTS is not None:
+        snapshot = SNAPSHOTS.get('schedule.compact')
+        return snapshot, snapshot.body
+    payloads = schedule_payloads()
+    return payloads, payloads['compact']
+
+def schedule_body(encoding, gzipped):
+    """
+    One /api/schedule body ("json" or "compact", optionally gzipped) for the current
+    bucket. Gzipped variants are compressed on first use and cached with the payloads.
+    """
+    payloads = schedule_payloads()
+    if not gzipped:
+        return payloads[encoding]
+    key = f"{encoding}.gz"
+    with SCHEDULE_RESPONSE_LOCK:
+        if key not in payloads:
+            payloads[key] = gzip.compress(payloads[encoding], compresslevel=6)
+        return payloads[key]
+
+def bootstrap_version():
+    """Data version of the bundle: stat of every file it is built from, schedule included."""
+    version = []
+    for name, path in BOOTSTRAP_FILES + [("schedule", SCHEDULE_FILE)]:
+        st = os.stat(path) if os.path.exists(path) else None
+        version.append((name, st.st_mtime_ns if st else None, st.st_size if st else None))
+    return tuple(version)
+
+def build_bootstrap_static(version):
+    """Meta header plus the file sections, raw and as the start of one gzip stream."""
+    tag = hashlib.sha1(repr(version).encode('utf-8')).hexdigest()[:20]
+    present = [(name, path) for name, path in BOOTSTRAP_FILES if os.path.exists(path)]
+    header = {"section": "meta", "version": tag, "sections": [n for n, _ in present] + ["schedule"]}
+    chunks = [json.dumps(header).encode('utf-8') + b'\n']
+
+    # Files are spliced in raw. Newlines inside JSON are only whitespace,
+    # so flattening them keeps one section per line.
+    for name, path in present:
+        with open(path, 'rb') as f:
+            raw = f.read().replace(b'\r', b' ').replace(b'\n', b' ')
+        chunks.append(b'{"section":"' + name.encode('utf-8') + b'","data":' + raw + b'}\n')
+
+    # Sync-flushed per section so the client can inflate and parse each
+    # section as soon as its bytes arrive. The stream is left open for the schedule.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    gzip_chunks = [compressor.compress(c) + compressor.flush(zlib.Z_SYNC_FLUSH) for c in chunks]
+    crc = 0
+    for c in chunks:
+        crc = zlib.crc32(c, crc)
+    return {"tag": tag, "chunks": chunks, "gzip_chunks": gzip_chunks,
+            "crc": crc, "size": sum(len(c) for c in chunks)}
+
+def bootstrap_bundle():
+    """
+    Returns the first-paint bundle as {"etag", "gzip_etag", "chunks": [bytes],
+    "gzip_chunks": [bytes]}, one chunk per section.
+
+    The file sections (and their gzip prefix) are rebuilt only when a file's
+    stat changes. The schedule section follows the 60s schedule bucket, and
+    only it is re-encoded and compressed. The ETags are weak and track the data
+    version, not the bucket: a client revalidating an older bundle keeps its
+    schedule window and re-fetches /api/schedule if that is too old (src/api.js).
+    """
+    version = bootstrap_version()
+    with BOOTSTRAP_LOCK:
+        if BOOTSTRAP_CACHE['version'] != version:
+            started = time.time()
+            BOOTSTRAP_CACHE['static'] = build_bootstrap_static(version)
+            BOOTSTRAP_CACHE['version'] = version
+            BOOTSTRAP_CACHE['bundle'] = None
+            print(f"Bootstrap file sections rebuilt in {time.time() - started:.2f}s", flush=True)
+
+        source, compact = schedule_compact()
+        if BOOTSTRAP_CACHE['bundle'] is not None and BOOTSTRAP_CACHE['schedule'] is source:
+            return BOOTSTRAP_CACHE['bundle']
+
+        static = BOOTSTRAP_CACHE['static']
+        chunk = (b'{"section":"schedule","encoding":"compact","generated":' + str(int(time.time())).encode('utf-8') +
+                 b',"data":' + compact + b'}\n')
+        # A fresh raw deflate stream can continue the prefix after its sync flush;
+        # the gzip trailer's CRC and length are extended over the new bytes
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        gzip_tail = (compressor.compress(chunk) + compressor.flush() +
+                     struct.pack('<II', zlib.crc32(chunk, static['crc']), (static['size'] + len(chunk)) & 0xffffffff))
+
+        bundle = {
+            "etag": f'W/"{static["tag"]}"',
+            "gzip_etag": f'W/"{static["tag"]}-gzip"',
+            "chunks": static['chunks'] + [chunk],
+            "gzip_chunks": static['gzip_chunks'] + [gzip_tail]
+        }
+        BOOTSTRAP_CACHE['schedule'] = source
+        BOOTSTRAP_CACHE['bundle'] = bundle
+        return bundle
+
+def warm_realtime():
+    """Retries the first realtime fetch until it succeeds; /api/ready depends on it."""
+    while not RT_CACHE['data']:
+        refresh_realtime_if_stale()
+        if not RT_CACHE['data']:
+            time.sleep(5)
+
+def current_gbfs():
+    """Returns the GbfsProxy, first pulling the poller's latest state in pre-fork workers."""
+    if GBFS is not None and SNAPSHOTS is not None:
+        snapshot = SNAPSHOTS.get('citibike')
+        if snapshot is not None and snapshot.updated != GBFS.version:
+            GBFS.load_state(bytes(snapshot.body))
+    return GBFS
+
+def start_warmup():
+    """Loads the schedule and the first realtime snapshot in the background (single-process mode)."""
+    threading.Thread(target=load_schedule, name="schedule-loader", daemon=True).start()
+    threading.Thread(target=warm_realtime, name="rt-warmup", daemon=True).start()
+
+def readiness():
+    """
+    Returns (ready, checks) for /api/ready. Ready once realtime is warm and the
+    schedule load has finished. A failed schedule load (e.g. no schedule file)
+    does not block traffic, as the server runs without one; it is reported as
+    "degraded" instead, since the load is never retried.
+    """
+    if SNAPSHOTS is not None:
+        realtime_warm = SNAPSHOTS.get('realtime') is not None
+    else:
+        realtime_warm = bool(RT_CACHE['data'])
+    state = schedule_state()
+    checks = {"schedule": state, "realtime": "ready" if realtime_warm else "loading"}
+    if state == "failed":
+        checks["degraded"] = True
+    return state != "loading" and realtime_warm, checks
+
 class MyHandler(http.server.SimpleHTTPRequestHandler):
     def end_headers(self):
         # Enable CORS
@@ -252,7 +689,108 @@ class MyHandler(http.server.SimpleHTTPRequestHandler):
             
         super().end_headers()
 
+    def send_snapshot(self, name, empty, content_type='application/json'):
+        """Serves a poller-published snapshot straight from shared memory."""
+        snapshot = SNAPSHOTS.get(name)
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Vary', 'Accept, Accept-Encoding')
+        if snapshot is None:
+            content = empty
+        elif 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = snapshot.gzipped
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            content = snapshot.body
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_citibike(self, query):
+        """/api/citibike[?since=<version>][&bbox=minLon,minLat,maxLon,maxLat]"""
+        from gbfs_proxy import parse_bbox
+        proxy = current_gbfs()
+        if proxy is None or not proxy.static:
+            self.send_response(503 if GBFS_BASE_URL else 404)
+            self.send_header('Content-type', 'application/json')
+            if GBFS_BASE_URL:
+                self.send_header('Retry-After', '5')
+            self.end_headers()
+            self.wfile.write(b'{"error": "Citi Bike data not available"}')
+            return
+
+        try:
+            since = int(query['since'][0]) if 'since' in query else None
+        except ValueError:
+            since = -1
+        bbox = parse_bbox(query['bbox'][0]) if 'bbox' in query else None
+        if (since is not None and since < 0) or ('bbox' in query and bbox is None):
+            self.send_response(400)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{"error": "since must be a version, bbox must be minLon,minLat,maxLon,maxLat"}')
+            return
+
+        accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Cache-Control', 'no-cache')
+        if since is None and bbox is None:
+            full = proxy.full_payload()
+            content = full['gzip'] if accepts_gzip else full['json']
+        else:
+            content = proxy.payload(since, bbox)
+            # Deltas are usually a few hundred bytes; not worth compressing
+            accepts_gzip = accepts_gzip and len(content) > 4096
+            if accepts_gzip:
+                content = gzip.compress(content, compresslevel=6)
+        if accepts_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
     def do_GET(self):
+        if PROFILER.should_sample():
+            return PROFILER.run(self.handle_get)
+        return self.handle_get()
+
+    def admin_allowed(self):
+        """Sends 403 and returns False unless ADMIN_TOKEN is set and the request carries it."""
+        token = self.headers.get('X-Admin-Token', '')
+        if ADMIN_TOKEN and hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+            return True
+        self.send_response(403)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{"error": "Admin endpoints need ADMIN_TOKEN and a matching X-Admin-Token header"}')
+        return False
+
+    def send_profile(self, query):
+        """GET /api/admin/profile[?format=json|pstats|collapsed][&sort=cumulative][&limit=40]"""
+        fmt = query.get('format', ['json'])[0]
+        if fmt == 'pstats':
+            try:
+                limit = int(query.get('limit', ['40'])[0])
+            except ValueError:
+                limit = 40
+            sort = query.get('sort', ['cumulative'])[0]
+            if sort not in ('cumulative', 'tottime', 'calls', 'ncalls', 'time', 'name'):
+                sort = 'cumulative'
+            content, content_type = PROFILER.pstats_text(sort, limit).encode('utf-8'), 'text/plain; charset=utf-8'
+        elif fmt == 'collapsed':
+            content, content_type = PROFILER.collapsed().encode('utf-8'), 'text/plain; charset=utf-8'
+        else:
+            content, content_type = json.dumps(PROFILER.status()).encode('utf-8'), 'application/json'
+
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def handle_get(self):
         # Parse path to ignore query params
         parsed_url = urlparse(self.path)
         parsed_path = parsed_url.path
@@ -281,124 +819,193 @@ class MyHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(b'{"error": "Data not found. Run scripts/update_data.py first."}')
         
-        elif parsed_path == '/api/schedule':
-            self.send_response(200)
+        elif parsed_path in ('/api/schedule', '/api/bootstrap') and schedule_state() != "ready":
+            # Still loading in the background (or the file is missing)
+            state = schedule_state()
+            self.send_response(503 if state == "loading" else 500)
             self.send_header('Content-type', 'application/json')
-            
-            if SCHEDULE_CACHE:
-                # Calculate time window using NYC time
-                try:
-                    from zoneinfo import ZoneInfo
-                    tz = ZoneInfo("America/New_York")
-                except ImportError:
-                    # Fallback for older python (though 3.11 is used)
-                    # Simple offset for EST/EDT (imperfect but better than UTC)
-                    tz = datetime.timezone(datetime.timedelta(hours=-4))
-                
-                now = datetime.datetime.now(tz)
-                # Midnight for today in NYC
-                midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                seconds_since_midnight = (now - midnight).total_seconds()
-                
-                # Window logic
-                start_window = seconds_since_midnight - 600 # 10 mins buffer
-                end_window = seconds_since_midnight + (2 * 3600) # 2 hours ahead
+            if state == "loading":
+                self.send_header('Retry-After', '2')
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Schedule {state}"}).encode('utf-8'))
 
-                # Handle wraparound for late night (if near 24h, schedule might go > 86400)
-                # For simplicity, we just filter. Ideally we handle day overlap.
-                
-                # Determine Service ID based on NYC Time
-                dow = now.weekday() # 0=Mon, 5=Sat, 6=Sun
-                if dow == 5:
-                    target_service = "Saturday"
-                elif dow == 6:
-                    target_service = "Sunday"
-                else:
-                    target_service = "Weekday"
-                
-                print(f"Loading Schedule for {target_service} (DOW: {dow})", flush=True)
+        elif parsed_path == '/api/bootstrap':
+            bundle = bootstrap_bundle()
+            use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+            etag = bundle['gzip_etag'] if use_gzip else bundle['etag']
+            if etag in (t.strip() for t in self.headers.get('If-None-Match', '').split(',')):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return
 
-                filtered_routes = {}
-                active_trips_count = 0
-                
-                # Filter Routes
-                for route_id, trips in SCHEDULE_CACHE.get('routes', {}).items():
-                    filtered_trips = []
-                    for trip in trips:
-                        # Check Service ID
-                        if trip.get('serviceId') != target_service:
-                            continue
-
-                        stops = trip.get('stops', [])
-                        if not stops: continue
-                        
-                        start_time = stops[0]['time']
-                        end_time = stops[-1]['time']
-                        
-                        # Check overlap: Trip starts before window ends AND trip ends after window starts
-                        if start_time <= end_window and end_time >= start_window:
-                            filtered_trips.append(trip)
-                    
-                    if filtered_trips:
-                        filtered_routes[route_id] = filtered_trips
-                        active_trips_count += len(filtered_trips)
-                
-                print(f"Server returning {active_trips_count} trips.", flush=True)
-                
-                response_data = {
-                    'routes': filtered_routes,
-                    'stops': SCHEDULE_CACHE.get('stops', {}),
-                    'meta': {
-                        'window_start': start_window,
-                        'window_end': end_window,
-                        'total_trips': active_trips_count
-                    }
-                }
-                
-                content = json.dumps(response_data).encode('utf-8')
+            chunks = bundle['gzip_chunks'] if use_gzip else bundle['chunks']
+            self.send_response(200)
+            self.send_header('Content-type', 'application/x-ndjson')
+            if use_gzip:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Content-Length', str(sum(len(c) for c in chunks)))
+            self.end_headers()
+            # Section by section, so the config is on the wire before the schedule
+            for chunk in chunks:
+                self.wfile.write(chunk)
+                self.wfile.flush()
 
-                # Gzip Compression
-                if 'gzip' in self.headers.get('Accept-Encoding', ''):
-                    content = gzip.compress(content)
-                    self.send_header('Content-Encoding', 'gzip')
+        elif parsed_path == '/api/schedule' and SNAPSHOTS is not None:
+            compact = wants_compact(self.headers.get('Accept'))
+            self.send_snapshot('schedule.compact' if compact else 'schedule', b'{}',
+                               COMPACT_MEDIA_TYPE if compact else 'application/json')
 
-                self.send_header('Content-Length', str(len(content)))
+        elif parsed_path == '/api/schedule':
+            compact = wants_compact(self.headers.get('Accept'))
+            use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+            content = schedule_body('compact' if compact else 'json', use_gzip)
+
+            self.send_response(200)
+            self.send_header('Content-type', COMPACT_MEDIA_TYPE if compact else 'application/json')
+            self.send_header('Vary', 'Accept, Accept-Encoding')
+            if use_gzip:
+                self.send_header('Content-Encoding', 'gzip')
+
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        elif parsed_path == '/api/realtime' and 'at' in parse_qs(parsed_url.query):
+            # Historical playback: nearest archived snapshot at or before ?at=<unix ts>
+            try:
+                at = float(parse_qs(parsed_url.query)['at'][0])
+                if not math.isfinite(at):
+                    raise ValueError(at)
+            except ValueError:
+                self.send_response(400)
+                self.send_header('Content-type', 'application/json')
                 self.end_headers()
-                self.wfile.write(content)
+                self.wfile.write(b'{"error": "at must be a unix timestamp"}')
+                return
+
+            snapshot = RT_ARCHIVE.lookup(at) if RT_ARCHIVE else None
+            if snapshot is None:
+                self.send_response(404)
+                self.send_header('Content-type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{"error": "No archived snapshot at or before that time"}')
+                return
+
+            updated, trips = snapshot
+            content = json.dumps({"updated": updated, "at": at, "trips": trips}).encode('utf-8')
+
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                content = gzip.compress(content)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        elif parsed_path == '/api/realtime' and SNAPSHOTS is not None:
+            if wants_compact(self.headers.get('Accept')):
+                self.send_snapshot('realtime.compact', encode_realtime(0, []), COMPACT_MEDIA_TYPE)
             else:
-                 self.send_response(500)
-                 self.end_headers()
-                 self.wfile.write(b'{"error": "Schedule not loaded"}')
+                self.send_snapshot('realtime', b'{"updated": 0, "trips": []}')
 
         elif parsed_path == '/api/realtime':
             self.send_response(200)
-            self.send_header('Content-type', 'application/json')
+            self.send_header('Content-type', COMPACT_MEDIA_TYPE if wants_compact(self.headers.get('Accept')) else 'application/json')
             
-            # Simple Caching (30s)
-            now_ts = datetime.datetime.now().timestamp()
-            
-            with RT_LOCK:
-                if not RT_CACHE['data'] or (now_ts - RT_CACHE['last_updated'] > 30):
-                    print(f"Refreshing Realtime Data... (Cached: {bool(RT_CACHE['data'])}, Age: {now_ts - RT_CACHE['last_updated']:.1f}s)", flush=True)
-                    try:
-                        new_data = fetch_realtime_feed()
-                        # Only update if we got *some* data (simple safety)
-                        if new_data: 
-                            RT_CACHE['data'] = new_data
-                            RT_CACHE['last_updated'] = now_ts
-                    except Exception as e:
-                        print(f"Global RT Fetch Error: {e}", flush=True)
+            refresh_realtime_if_stale()
             
-            response_data = {
-                "updated": RT_CACHE['last_updated'],
-                "trips": RT_CACHE['data'] or []
-            }
-            
-            content = json.dumps(response_data).encode('utf-8')
+            compact = wants_compact(self.headers.get('Accept'))
+            payloads = RT_CACHE['payloads'] or encode_realtime_payloads(RT_CACHE['last_updated'], [])
+            content = payloads['compact' if compact else 'json']
+            self.send_header('Vary', 'Accept')
             self.send_header('Content-Length', str(len(content)))
             self.end_headers()
             self.wfile.write(content)
             
+        elif parsed_path == '/api/admin/profile':
+            if not self.admin_allowed():
+                return
+            self.send_profile(parse_qs(parsed_url.query))
+
+        elif parsed_path == '/api/stats':
+            route = parse_qs(parsed_url.query).get('route', [None])[0]
+            if route is not None and not route.isalnum():
+                self.send_response(400)
+                self.send_header('Content-type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{"error": "Unknown route"}')
+                return
+            if SNAPSHOTS is not None:
+                name = f'stats.{route}' if route else 'stats'
+                empty = b''
+                if SNAPSHOTS.get(name) is None:
+                    # Same body shape as single-process mode for a route without data (or before the first poll)
+                    base = SNAPSHOTS.get('stats') if route else None
+                    empty = without_route_data(bytes(base.body)) if base is not None else STATS.payload(route)
+                self.send_snapshot(name, empty)
+                return
+            refresh_realtime_if_stale()
+            content = STATS.payload(route)
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Cache-Control', 'no-cache')
+            if 'gzip' in self.headers.get('Accept-Encoding', '') and len(content) > 4096:
+                content = gzip.compress(content, compresslevel=6)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        elif parsed_path == '/api/search':
+            query = parse_qs(parsed_url.query)
+            if SEARCH_INDEX is None:
+                self.send_response(503)
+                self.send_header('Content-type', 'application/json')
+                self.send_header('Retry-After', '2')
+                self.end_headers()
+                self.wfile.write(b'{"error": "Search index loading"}')
+                return
+            try:
+                limit = min(SEARCH_MAX_LIMIT, max(1, int(query.get('limit', ['10'])[0])))
+            except ValueError:
+                limit = 10
+            q = query.get('q', [''])[0]
+            results = SEARCH_INDEX.search(q, route=query.get('route', [None])[0], limit=limit) if q.strip() else []
+            content = json.dumps({"query": q, "results": results}).encode('utf-8')
+
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Cache-Control', 'public, max-age=300')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        elif parsed_path == '/api/citibike':
+            self.send_citibike(parse_qs(parsed_url.query))
+
+        elif parsed_path == '/api/health':
+            # Liveness: the process is up and serving
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(json.dumps({"status": "ok", "uptime": round(time.time() - STARTED_AT, 3)}).encode('utf-8'))
+
+        elif parsed_path == '/api/ready':
+            # Readiness: only route traffic here once the caches are warm
+            ready, checks = readiness()
+            self.send_response(200 if ready else 503)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(json.dumps({"ready": ready, "checks": checks}).encode('utf-8'))
+
         elif parsed_path == '/api/version':
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
@@ -406,6 +1013,9 @@ class MyHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(b'{"version": "1.1.0"}')
 
+        elif self.path == '/api/alerts' and SNAPSHOTS is not None:
+            self.send_snapshot('alerts', b'[]')
+
         elif self.path == '/api/alerts':
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
@@ -459,7 +1069,23 @@ class MyHandler(http.server.SimpleHTTPRequestHandler):
             return http.server.SimpleHTTPRequestHandler.do_GET(self)
 
     def do_POST(self):
-        if self.path == '/api/log':
+        parsed_url = urlparse(self.path)
+        if parsed_url.path == '/api/admin/profile':
+            # ?sample=<0..1>&timers=0|1&reset=1
+            if not self.admin_allowed():
+                return
+            query = parse_qs(parsed_url.query)
+            try:
+                sample_rate = float(query['sample'][0]) if 'sample' in query else None
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            timers = query['timers'][0] not in ('', '0') if 'timers' in query else None
+            PROFILER.configure(sample_rate=sample_rate, timers=timers, reset='reset' in query)
+            print(f"[Profile] sample rate {PROFILER.sample_rate}, timers {'on' if PROFILER.timers else 'off'}", flush=True)
+            self.send_profile({})
+        elif self.path == '/api/log':
             # Only allow writing logs if DEBUG env var is set OR we are in development
             if ENV != 'development' and not os.environ.get('DEBUG'):
                 self.send_response(403)
@@ -488,37 +1114,153 @@ class MyHandler(http.server.SimpleHTTPRequestHandler):
 class ReuseAddrTCPServer(socketserver.TCPServer):
     allow_reuse_address = True
 
+def run_poller(store):
+    """Pre-fork poller: the only process that talks to MTA. Never returns."""
+    global RT_ARCHIVE
+    if RT_ARCHIVE_DIR:
+        from rt_archive import SnapshotArchive
+        RT_ARCHIVE = SnapshotArchive(RT_ARCHIVE_DIR, retention_hours=RT_ARCHIVE_RETENTION_HOURS).start()
+
+    # Delay analytics need scheduled times; workers get the encoded schedule from the store
+    def load_and_publish():
+        load_schedule(index_stations=False)
+        publish_schedule(store)
+    threading.Thread(target=load_and_publish, name="schedule-loader", daemon=True).start()
+
+    if GBFS_BASE_URL:
+        from gbfs_proxy import GbfsProxy
+        GbfsProxy(GBFS_BASE_URL).start(
+            on_update=lambda proxy: store.publish('citibike', proxy.version, proxy.export_state())
+        )
+
+    last_alerts = 0
+    stats_routes = set()  # every route ever published, so a service-day reset empties them all
+    while True:
+        started = time.time()
+        try:
+            trips = fetch_realtime_feed()
+            if trips:
+                set_realtime_snapshot(started, trips)
+                store.publish('realtime', started, RT_CACHE['payloads']['json'])
+                store.publish('realtime.compact', started, RT_CACHE['payloads']['compact'])
+                update_stats(started, trips)
+                store.publish('stats', started, STATS.payload())
+                stats_routes.update(STATS.export_routes())
+                for route in sorted(stats_routes):
+                    store.publish(f'stats.{route}', started, STATS.payload(route))
+                if RT_ARCHIVE:
+                    RT_ARCHIVE.append(started, trips)
+        except Exception as e:
+            print(f"[Poller] Realtime refresh failed: {e}", flush=True)
+
+        try:
+            publish_schedule(store)
+        except Exception as e:
+            print(f"[Poller] Schedule publish failed: {e}", flush=True)
+
+        if started - last_alerts >= ALERTS_REFRESH_SECONDS:
+            new_alerts = fetch_alerts_feed()
+            if new_alerts is not None:
+                store.publish('alerts', started, json.dumps(new_alerts).encode('utf-8'))
+                last_alerts = started
+
+        time.sleep(max(1, RT_REFRESH_SECONDS - (time.time() - started)))
+
+def run_worker(httpd, store):
+    """Pre-fork worker: serves requests on the inherited listening socket. Never returns."""
+    global SNAPSHOTS, RT_ARCHIVE, GBFS
+    SNAPSHOTS = store
+    if RT_ARCHIVE_DIR:
+        from rt_archive import SnapshotArchive
+        RT_ARCHIVE = SnapshotArchive(RT_ARCHIVE_DIR, readonly=True)
+    if GBFS_BASE_URL:
+        from gbfs_proxy import GbfsProxy
+        GBFS = GbfsProxy(GBFS_BASE_URL)
+    # The poller owns realtime and the schedule; workers only index station names
+    threading.Thread(target=index_published_stops, name="search-index", daemon=True).start()
+    httpd.serve_forever()
+
+def index_published_stops():
+    """Pre-fork worker: builds the search index once the poller has published the schedule's stops."""
+    while schedule_state() == "loading":
+        time.sleep(1)
+    snapshot = SNAPSHOTS.get('schedule.stops')
+    build_search_index(json.loads(bytes(snapshot.body)) if snapshot is not None else None)
+
+def serve_prefork(workers):
+    """Binds once, forks a poller plus `workers` servers and respawns any that die."""
+    from snapshot_store import SnapshotStore
+    store = SnapshotStore(SNAPSHOT_DIR)
+    PROFILER.share(os.path.join(SNAPSHOT_DIR, 'profile'))
+    httpd = ReuseAddrTCPServer(("", PORT), MyHandler)
+    print(f"Pre-fork mode: {workers} workers, snapshots in {SNAPSHOT_DIR}", flush=True)
+
+    children = {}  # pid -> role
+
+    def spawn(role):
+        pid = os.fork()
+        if pid == 0:
+            # Children exit on SIGTERM; Ctrl-C is handled by the supervisor
+            signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            try:
+                if role == 'poller':
+                    httpd.socket.close()
+                    run_poller(store)
+                else:
+                    run_worker(httpd, store)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        children[pid] = role
+
+    spawn('poller')
+    for _ in range(workers):
+        spawn('worker')
+
+    def shutdown(*_):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # Only what the store and profiler wrote: SNAPSHOT_DIR may be a shared directory
+        PROFILER.unshare()
+        store.clear()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    while True:
+        pid, status = os.wait()
+        role = children.pop(pid, None)
+        if role:
+            print(f"[Supervisor] {role} {pid} exited ({status}), respawning", flush=True)
+            time.sleep(1)
+            spawn(role)
+
 if __name__ == "__main__":
     print(f"Server starting on port {PORT} in {ENV} mode...")
     
-    # Load Schedule
-    try:
-        with open(SCHEDULE_FILE, 'r') as f:
-            SCHEDULE_CACHE = json.load(f)
-        
-        print("Normalizing Trip IDs...")
-        count = 0
-        for rid, trips in SCHEDULE_CACHE.get('routes', {}).items():
-            for trip in trips:
-                original = trip.get('tripId', "")
-                parts = original.split('_')
-                if len(parts) >= 2:
-                    trip['tripId'] = "_".join(parts[-2:])
-                    count += 1
-        print(f"Schedule loaded and normalized {count} IDs successfully.")
-
-    except Exception as e:
-        print(f"Failed to load schedule: {e}")
+    if WORKERS > 1:
+        serve_prefork(WORKERS)
+    else:
+        if RT_ARCHIVE_DIR:
+            from rt_archive import SnapshotArchive
+            RT_ARCHIVE = SnapshotArchive(RT_ARCHIVE_DIR, retention_hours=RT_ARCHIVE_RETENTION_HOURS).start()
+            print(f"Realtime archive at {RT_ARCHIVE_DIR}: {RT_ARCHIVE.stats()}")
 
-    # Start Realtime Thread (Poller for Trips)
-    # We disable daemon mode so it doesn't just die instantly if main exits (but typical httpd.serve_forever keeps it alive)
-    # rt_thread = threading.Thread(target=fetch_realtime_feed, daemon=True)
-    # rt_thread.start()
+        if GBFS_BASE_URL:
+            from gbfs_proxy import GbfsProxy
+            GBFS = GbfsProxy(GBFS_BASE_URL).start()
 
-    # Alert Thread Removed (Now On-Demand via /api/alerts)
-
-    try:
-        with ReuseAddrTCPServer(("", PORT), MyHandler) as httpd:
-            httpd.serve_forever()
-    except KeyboardInterrupt:
-        pass
+        # Realtime and alerts are refreshed on-demand by the handler in single-process mode
+        try:
+            with ReuseAddrTCPServer(("", PORT), MyHandler) as httpd:
+                print(f"Listening after {time.time() - STARTED_AT:.2f}s; warming caches in the background.", flush=True)
+                start_warmup()
+                httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,92 @@
+"""
+Shared, pre-serialized snapshots for the pre-fork server.
+
+The poller process publishes each snapshot as one file (header + JSON body +
+gzipped body) and atomically swaps it in with os.replace(). Workers mmap the
+current file and hand out memoryviews of it, so serving a snapshot never
+re-parses, re-serializes or re-compresses anything. Put the directory on
+tmpfs (/dev/shm) and the mapping is plain shared memory.
+"""
+import gzip
+import mmap
+import os
+import struct
+import threading
+
+HEADER = struct.Struct('>8sdQQ')  # magic, updated ts, json length, gzip length
+MAGIC = b'NYCSNAP1'
+
+
+class Snapshot:
+    def __init__(self, updated, body, gzipped):
+        self.updated = updated
+        self.body = body        # memoryview of the JSON bytes
+        self.gzipped = gzipped  # memoryview of the gzip bytes
+
+
+class SnapshotStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._mapped = {}  # name -> (inode, mtime_ns, Snapshot)
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.snap")
+
+    def publish(self, name, updated, body):
+        """Writes a snapshot and atomically replaces the previous one."""
+        gzipped = gzip.compress(body, compresslevel=6)
+        path = self._path(name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, updated, len(body), len(gzipped)))
+            f.write(body)
+            f.write(gzipped)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        """Deletes every published snapshot and leftover temp file, then the directory if that empties it."""
+        for entry in os.listdir(self.directory):
+            if entry.endswith('.snap') or (entry.endswith('.tmp') and '.snap.' in entry):
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except OSError:
+                    pass
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass
+
+    def get(self, name):
+        """
+        Returns the current Snapshot or None if nothing was published yet.
+        Costs one stat() per call; the file is only re-mapped after a publish.
+        """
+        path = self._path(name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        key = (st.st_ino, st.st_mtime_ns)
+        with self._lock:
+            cached = self._mapped.get(name)
+            if cached and cached[0] == key:
+                return cached[1]
+
+            with open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, updated, body_len, gz_len = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                return None
+            view = memoryview(mm)
+            start = HEADER.size
+            snapshot = Snapshot(
+                updated,
+                view[start:start + body_len],
+                view[start + body_len:start + body_len + gz_len]
+            )
+            # The old mapping is released once in-flight responses drop their views
+            self._mapped[name] = (key, snapshot)
+            return snapshot
@@ -1,4 +1,8 @@
+import { decodeSchedule } from './wire.js';
+
 const API_BASE = '/api';
+// A bundle revalidated with a 304 keeps the schedule window it was built with
+const BOOTSTRAP_SCHEDULE_MAX_AGE_S = 600;
 
 export async function fetchConfig() {
     try {
@@ -10,3 +14,67 @@ export async function fetchConfig() {
         throw err;
     }
 }
+
+/**
+ * Fetches the /api/bootstrap bundle (config, stations, neighborhoods,
+ * stopsCoords, schedule) in one request and returns one promise per section.
+ * Sections are newline-delimited and resolve as soon as their line arrives,
+ * so the config can be used before the schedule has finished downloading.
+ * Any section the bundle doesn't deliver is fetched with `fallbacks[name]()`,
+ * which must retry on its own if the server is still warming up.
+ */
+export function fetchBootstrap(fallbacks) {
+    const handlers = {};
+    const sections = {};
+    Object.keys(fallbacks).forEach(name => {
+        sections[name] = new Promise((resolve, reject) => { handlers[name] = { resolve, reject }; });
+    });
+
+    const settle = (name, data) => {
+        if (!handlers[name]) return;
+        handlers[name].resolve(data);
+        delete handlers[name];
+        if (window.startupMetrics) window.startupMetrics[`bootstrap_${name}`] = performance.now();
+    };
+
+    const fallBack = (reason) => {
+        Object.keys(handlers).forEach(name => {
+            console.warn(`[Bootstrap] ${name} via fallback (${reason})`);
+            const { resolve, reject } = handlers[name];
+            delete handlers[name];
+            fallbacks[name]().then(resolve, reject);
+        });
+    };
+
+    (async () => {
+        const res = await fetch(`${API_BASE}/bootstrap`);
+        // 503 while the schedule loads: fetch sections individually so config and
+        // stations aren't held up; the schedule fallback retries until it's ready
+        if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (value) buffer += decoder.decode(value, { stream: !done });
+            let newline;
+            while ((newline = buffer.indexOf('\n')) !== -1) {
+                const line = buffer.slice(0, newline);
+                buffer = buffer.slice(newline + 1);
+                if (!line) continue;
+                const section = JSON.parse(line);
+                if (section.section === 'meta') continue;
+                if (section.section === 'schedule' && Date.now() / 1000 - section.generated > BOOTSTRAP_SCHEDULE_MAX_AGE_S) {
+                    continue; // stale window: left to the fallback
+                }
+                const data = section.encoding === 'compact' ? decodeSchedule(section.data) : section.data;
+                settle(section.section, data);
+            }
+            if (done) break;
+        }
+        fallBack('missing or stale in bundle');
+    })().catch(err => fallBack(err.message));
+
+    return sections;
+}
@@ -1,42 +1,54 @@
 
-const STATION_INFO_URL = "https://gbfs.citibikenyc.com/gbfs/en/station_information.json";
-const STATION_STATUS_URL = "https://gbfs.citibikenyc.com/gbfs/en/station_status.json";
+const CITIBIKE_URL = "/api/citibike";
+export const CITIBIKE_REFRESH_MS = 30 * 1000;
 
-// We'll cache the merged data to avoid re-fetching constantly
-let cachedStations = [];
+// Merged station state, kept current with ?since= deltas from the server proxy
+const stationsById = new Map();
+let version = null;
+let lastFetch = 0;
 
-export async function fetchCitibikeStations() {
-    if (cachedStations.length > 0) return cachedStations;
-
-    console.log("Fetching Citibike Data...");
-    try {
-        const [infoRes, statusRes] = await Promise.all([
-            fetch(STATION_INFO_URL).then(r => r.json()),
-            fetch(STATION_STATUS_URL).then(r => r.json())
-        ]);
-
-        const infoMap = new Map();
-        infoRes.data.stations.forEach(s => infoMap.set(s.station_id, s));
+function applyPayload(payload) {
+    if (payload.full) stationsById.clear();
+    const fields = payload.fields;
+    payload.stations.forEach(row => {
+        const values = {};
+        fields.forEach((field, i) => { values[field] = row[i]; });
+        const station = stationsById.get(values.id) || { station_id: values.id };
+        if ('name' in values) {
+            station.name = values.name;
+            station.lat = values.lat;
+            station.lon = values.lon;
+            station.capacity = values.capacity;
+        }
+        station.num_bikes_available = values.bikes;
+        station.num_ebikes_available = values.ebikes;
+        station.num_docks_available = values.docks;
+        stationsById.set(values.id, station);
+    });
+    version = payload.version;
+}
 
-        const stations = [];
-        statusRes.data.stations.forEach(status => {
-            const info = infoMap.get(status.station_id);
-            if (info) {
-                stations.push({
-                    ...info,
-                    ...status,
-                    lat: info.lat,
-                    lon: info.lon
-                });
-            }
-        });
+/**
+ * Returns the merged station list, pulling a delta first unless the last
+ * fetch is under CITIBIKE_REFRESH_MS old (`force` skips that check, for the
+ * periodic refresh, whose timer can fire slightly early).
+ */
+export async function fetchCitibikeStations({ force = false } = {}) {
+    if (!force && stationsById.size > 0 && Date.now() - lastFetch < CITIBIKE_REFRESH_MS) {
+        return Array.from(stationsById.values());
+    }
 
-        cachedStations = stations;
-        return stations;
+    console.log(version === null ? "Fetching Citibike Data..." : `Updating Citibike Data since ${version}...`);
+    try {
+        const url = version === null ? CITIBIKE_URL : `${CITIBIKE_URL}?since=${version}`;
+        const res = await fetch(url);
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        applyPayload(await res.json());
+        lastFetch = Date.now();
     } catch (err) {
         console.error("Failed to fetch Citibike data", err);
-        return [];
     }
+    return Array.from(stationsById.values());
 }
 
 export function filterCitibikeStations(stations, type) {
@@ -1,10 +1,11 @@
 import './logger.js';
 import { initMap, renderSubwayLines, toggleRouteLayer, toggleRouteLayerBatch, layers, visibilityFilter } from './map.js';
-import { fetchConfig } from './api.js';
+import { fetchConfig, fetchBootstrap } from './api.js';
+import { fetchCompact, decodeSchedule } from './wire.js';
 import { renderStations } from './stations.js';
 import { createLegend, updateLegendLines } from './legend.js';
 import { startTrainAnimation } from './animation.js';
-import { fetchCitibikeStations, filterCitibikeStations } from './citibike.js';
+import { fetchCitibikeStations, filterCitibikeStations, CITIBIKE_REFRESH_MS } from './citibike.js';
 import { initRealtime } from './realtime.js';
 import { StatusPanel } from './status-panel.js';
 import { initAlerts } from './alerts.js';
@@ -47,17 +48,44 @@ async function runApp() {
     const map = initMap();
     layers.citibike.addTo(map);
 
-    createLegend(map, layers, async (color, checked) => {
-        if (!checked) {
-            layers.citibike.eachLayer(layer => {
-                if (layer.options.citibikeType === color) {
-                    layers.citibike.removeLayer(layer);
-                }
+    // Citi Bike: toggled layers are re-rendered from ?since= deltas every CITIBIKE_REFRESH_MS
+    const activeCitibike = new Set();
+    let citibikeTimer = null;
+
+    const removeCitibikeLayer = (color) => {
+        layers.citibike.eachLayer(layer => {
+            if (layer.options.citibikeType === color) {
+                layers.citibike.removeLayer(layer);
+            }
+        });
+    };
+
+    const renderCitibikeLayer = (stations, color) => {
+        removeCitibikeLayer(color);
+        const filtered = filterCitibikeStations(stations, color);
+        filtered.forEach(s => {
+            const marker = L.circleMarker([s.lat, s.lon], {
+                radius: 4,
+                fillColor: color === 'green' ? '#22c55e' : (color === 'yellow' ? '#fbbf24' : '#ef4444'),
+                color: '#fff',
+                weight: 1,
+                opacity: 1,
+                fillOpacity: 0.8,
+                citibikeType: color
             });
-            return;
-        }
 
-        const stations = await fetchCitibikeStations();
+            marker.bindPopup(`
+                <b>${s.name}</b><br>
+                🚲 Bikes: ${s.num_bikes_available}<br>
+                ⚡ E-Bikes: ${s.num_ebikes_available}<br>
+                🅿️ Docks: ${s.num_docks_available}
+             `);
+
+            marker.addTo(layers.citibike);
+        });
+    };
+
+    const updateCitibikeStatus = (stations) => {
         const total = stations.length;
         const empty = stations.filter(s => s.num_bikes_available === 0).length;
         const withEbikes = stations.filter(s => s.num_ebikes_available > 0).length;
@@ -79,28 +107,34 @@ async function runApp() {
         if (details) details.style.display = 'block';
 
         StatusPanel.log(`Fetched ${total} stations. ${totalBikes} bikes avail.`);
+    };
 
-        const filtered = filterCitibikeStations(stations, color);
-        filtered.forEach(s => {
-            const marker = L.circleMarker([s.lat, s.lon], {
-                radius: 4,
-                fillColor: color === 'green' ? '#22c55e' : (color === 'yellow' ? '#fbbf24' : '#ef4444'),
-                color: '#fff',
-                weight: 1,
-                opacity: 1,
-                fillOpacity: 0.8,
-                citibikeType: color
-            });
+    const refreshCitibike = async () => {
+        if (activeCitibike.size === 0 || document.visibilityState !== 'visible') return;
+        const stations = await fetchCitibikeStations({ force: true });
+        updateCitibikeStatus(stations);
+        // Layers toggled off while the request was in flight are skipped
+        activeCitibike.forEach(color => renderCitibikeLayer(stations, color));
+    };
 
-            marker.bindPopup(`
-                <b>${s.name}</b><br>
-                🚲 Bikes: ${s.num_bikes_available}<br>
-                ⚡ E-Bikes: ${s.num_ebikes_available}<br>
-                🅿️ Docks: ${s.num_docks_available}
-             `);
+    createLegend(map, layers, async (color, checked) => {
+        if (!checked) {
+            activeCitibike.delete(color);
+            removeCitibikeLayer(color);
+            if (activeCitibike.size === 0 && citibikeTimer) {
+                clearInterval(citibikeTimer);
+                citibikeTimer = null;
+            }
+            return;
+        }
 
-            marker.addTo(layers.citibike);
-        });
+        activeCitibike.add(color);
+        if (!citibikeTimer) citibikeTimer = setInterval(refreshCitibike, CITIBIKE_REFRESH_MS);
+
+        const stations = await fetchCitibikeStations();
+        if (!activeCitibike.has(color)) return;
+        updateCitibikeStatus(stations);
+        renderCitibikeLayer(stations, color);
     });
 
     try {
@@ -185,13 +219,22 @@ async function runApp() {
 }
 
 function prefetchData() {
+    // One streamed /api/bootstrap request; each section falls back to its own fetch
+    const bundle = fetchBootstrap({
+        config: () => fetchConfig(),
+        stations: () => fetch('./data/subway-stations.geojson').then(r => r.json()),
+        neighborhoods: () => fetch('./data/nyc-neighborhoods.geojson').then(r => r.json()),
+        schedule: () => fetchCompact('/api/schedule', decodeSchedule),
+        stopsCoords: () => fetch('./data/stops_coords.json').then(r => r.json())
+    });
+
     return {
-        config: fetchConfig().catch(e => { throw new Error("Config Fetch Failed: " + e) }),
-        stations: fetch('./data/subway-stations.geojson').then(r => r.json()).catch(e => { throw new Error("Stations Fetch Failed: " + e) }),
-        neighborhoods: fetch('./data/nyc-neighborhoods.geojson').then(r => r.json()).catch(e => { throw new Error("Neighborhoods Fetch Failed: " + e) }),
-        schedule: fetch('/api/schedule').then(r => r.json()).catch(e => { throw new Error("Schedule Fetch Failed: " + e) }),
+        config: bundle.config.catch(e => { throw new Error("Config Fetch Failed: " + e) }),
+        stations: bundle.stations.catch(e => { throw new Error("Stations Fetch Failed: " + e) }),
+        neighborhoods: bundle.neighborhoods.catch(e => { throw new Error("Neighborhoods Fetch Failed: " + e) }),
+        schedule: bundle.schedule.catch(e => { throw new Error("Schedule Fetch Failed: " + e) }),
         realtime: initRealtime().catch(e => { throw new Error("Realtime Init Failed: " + e) }),
-        stopsCoords: fetch('./data/stops_coords.json').then(r => r.json()).catch(e => {
+        stopsCoords: bundle.stopsCoords.catch(e => {
             console.warn("Stops Coords Fetch Failed, using fallback.");
             return {};
         })
@@ -1,4 +1,5 @@
 import { normId } from './utils.js';
+import { fetchCompact, decodeRealtime } from './wire.js';
 
 /**
  * Real-Time Data Manager
@@ -35,10 +36,7 @@ function scheduleNextPoll() {
 
 async function fetchRealtimeData() {
     try {
-        const res = await fetch('/api/realtime');
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-
-        const data = await res.json();
+        const data = await fetchCompact('/api/realtime', decodeRealtime);
 
         // ... (rest of logic)
 
@@ -1,5 +1,7 @@
 import { renderRouteBadge } from './ui.js';
 
+const SEARCH_DEBOUNCE_MS = 120;
+
 export class StationSearch {
     constructor(containerId) {
         this.container = document.getElementById(containerId);
@@ -7,6 +9,8 @@ export class StationSearch {
         this.resultsContainer = this.container.querySelector('#station-search-results');
         this.stations = []; // Array of { id, name, latlng, routes }
         this.routeConfigs = {};
+        this.searchTimer = null;
+        this.searchSeq = 0; // Drops responses that arrive after a newer keystroke
 
         // Bind events
         this.input.addEventListener('input', (e) => this.handleInput(e));
@@ -29,12 +33,32 @@ export class StationSearch {
     }
 
     handleInput(e) {
-        const query = this.input.value.trim().toLowerCase();
+        const query = this.input.value.trim();
         if (query.length === 0) {
+            clearTimeout(this.searchTimer);
+            this.searchSeq++;
             this.hideResults();
             return;
         }
 
+        // Debounced server-side search (abbreviations, typos, route:X filters);
+        // the local substring match covers the gap and any server failure
+        this.renderResults(this.localMatches(query.toLowerCase()));
+        clearTimeout(this.searchTimer);
+        const seq = ++this.searchSeq;
+        this.searchTimer = setTimeout(async () => {
+            try {
+                const res = await fetch(`/api/search?q=${encodeURIComponent(query)}&limit=10`);
+                if (!res.ok) throw new Error(`HTTP ${res.status}`);
+                const { results } = await res.json();
+                if (seq === this.searchSeq) this.renderResults(results);
+            } catch (err) {
+                console.warn("Server search failed, keeping local results", err);
+            }
+        }, SEARCH_DEBOUNCE_MS);
+    }
+
+    localMatches(query) {
         const matches = this.stations.filter(s =>
             s.name.toLowerCase().includes(query)
         );
@@ -50,7 +74,7 @@ export class StationSearch {
             return 0; // Keep original order otherwise
         });
 
-        this.renderResults(matches.slice(0, 10)); // Limit to 10
+        return matches.slice(0, 10); // Limit to 10
     }
 
     renderResults(matches) {
@@ -0,0 +1,104 @@
+/**
+ * Compact Wire Format
+ * Decoders for the columnar /api/realtime and /api/schedule payloads
+ * (see wire_format.py). Stop IDs are dictionary indexes and times are
+ * deltas against the previous time in the same stream.
+ */
+
+export const COMPACT_MEDIA_TYPE = 'application/vnd.nycmetro.compact+json';
+
+const MAX_RETRIES = 10;
+const MAX_BACKOFF_MS = 8000;
+
+/**
+ * fetch() that retries while the server answers 503 (e.g. the schedule is
+ * still loading right after a restart). Waits for Retry-After when given,
+ * with exponential backoff as the floor.
+ */
+export async function fetchWithRetry(url, options = {}) {
+    for (let attempt = 0; ; attempt++) {
+        const res = await fetch(url, options);
+        if (res.status !== 503 || attempt >= MAX_RETRIES) return res;
+        const retryAfter = parseFloat(res.headers.get('Retry-After')) * 1000;
+        const backoff = Math.min(250 * 2 ** attempt, MAX_BACKOFF_MS);
+        const delay = Number.isFinite(retryAfter) ? Math.max(retryAfter, backoff) : backoff;
+        console.warn(`[Fetch] ${url} not ready (503), retrying in ${Math.round(delay)}ms`);
+        await new Promise(resolve => setTimeout(resolve, delay));
+    }
+}
+
+/**
+ * Fetches `url` asking for the compact encoding and returns the regular
+ * JSON shape. Falls back transparently if the server answers with plain JSON.
+ */
+export async function fetchCompact(url, decode) {
+    const res = await fetchWithRetry(url, { headers: { 'Accept': `${COMPACT_MEDIA_TYPE}, application/json` } });
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const data = await res.json();
+    const type = res.headers.get('Content-Type') || '';
+    return type.includes(COMPACT_MEDIA_TYPE) ? decode(data) : data;
+}
+
+export function decodeRealtime(data) {
+    const { stops, routes, trips: cols } = data;
+    const trips = new Array(cols.tripId.length);
+    let cursor = 0;
+    let prev = 0;
+
+    for (let i = 0; i < cols.tripId.length; i++) {
+        const updates = new Array(cols.count[i]);
+        for (let j = 0; j < cols.count[i]; j++) {
+            const arrDelta = cols.time[2 * cursor];
+            const depDelta = cols.time[2 * cursor + 1];
+            let arrival = null;
+            let departure = null;
+            if (arrDelta !== null) { prev += arrDelta; arrival = { time: prev }; }
+            if (depDelta !== null) { prev += depDelta; departure = { time: prev }; }
+            updates[j] = { stopId: stops[cols.stop[cursor]], arrival, departure };
+            cursor++;
+        }
+
+        // Summary fields are derived from the first stop-time update (as the server does)
+        const first = updates[0];
+        const arrivalTime = first.arrival ? first.arrival.time : 0;
+        const departureTime = first.departure ? first.departure.time : 0;
+        trips[i] = {
+            tripId: cols.tripId[i],
+            routeId: routes[cols.route[i]],
+            startTime: cols.startTime[i],
+            startDate: cols.startDate[i],
+            stopId: first.stopId,
+            status: arrivalTime ? 'IN_TRANSIT_TO' : 'STOPPED_AT',
+            time: arrivalTime || departureTime,
+            stopTimeUpdate: updates
+        };
+    }
+    return { updated: data.updated, trips };
+}
+
+export function decodeSchedule(data) {
+    const { stopIds, services } = data;
+    const routes = {};
+
+    for (const [routeId, cols] of Object.entries(data.routes)) {
+        const trips = new Array(cols.tripId.length);
+        let cursor = 0;
+        let prev = 0;
+        for (let i = 0; i < cols.tripId.length; i++) {
+            const stops = new Array(cols.count[i]);
+            for (let j = 0; j < cols.count[i]; j++) {
+                prev += cols.time[cursor];
+                stops[j] = { id: stopIds[cols.stop[cursor]], time: prev };
+                cursor++;
+            }
+            trips[i] = {
+                tripId: cols.tripId[i],
+                dir: cols.dir[i],
+                serviceId: services[cols.service[i]],
+                stops
+            };
+        }
+        routes[routeId] = trips;
+    }
+    return { routes, stops: data.stops, meta: data.meta };
+}
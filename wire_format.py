@@ -0,0 +1,214 @@
+"""
+Compact columnar encoding for /api/realtime and /api/schedule.
+
+Clients opt in with `Accept: application/vnd.nycmetro.compact+json`. The payload
+is still JSON, so it needs no extra dependencies on either side, but
+per-stop objects become flat arrays:
+- stop IDs (and routes / service IDs) are replaced by indexes into a dictionary
+- times are delta-encoded against the previous time in the same stream
+
+src/wire.js holds the matching browser decoder.
+"""
+import functools
+import json
+import math
+
+COMPACT_MEDIA_TYPE = "application/vnd.nycmetro.compact+json"
+COMPACT_VERSION = 1
+
+
+def _media_ranges(accept_header):
+    """Yields (media range, q) for each entry of an Accept header."""
+    for entry in accept_header.split(','):
+        parts = entry.split(';')
+        media = parts[0].strip().lower()
+        if not media:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+                q = min(1.0, max(0.0, q)) if math.isfinite(q) else 0.0
+        yield media, q
+
+
+@functools.lru_cache(maxsize=256)
+def wants_compact(accept_header):
+    """
+    True when the Accept header prefers the compact encoding over plain JSON.
+    Only an explicit compact media range opts in (wildcards don't), with q > 0
+    and at least the q of the most specific range matching application/json.
+    """
+    compact = 0.0
+    plain = {}
+    for media, q in _media_ranges(accept_header or ''):
+        if media == COMPACT_MEDIA_TYPE:
+            compact = max(compact, q)
+        elif media in ('application/json', 'application/*', '*/*'):
+            plain[media] = max(plain.get(media, 0.0), q)
+    json_q = plain.get('application/json', plain.get('application/*', plain.get('*/*', 0.0)))
+    return compact > 0 and compact >= json_q
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+class _Dictionary:
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def add(self, value):
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+
+# --- Realtime ---
+
+def encode_realtime(updated, trips):
+    """
+    Encodes the /api/realtime trip list. The per-trip summary fields (stopId,
+    status, time) are derived from the first stop-time update, so they are
+    not sent.
+    """
+    stops, routes = _Dictionary(), _Dictionary()
+    trip_ids, route_idx, start_times, start_dates = [], [], [], []
+    counts, stop_idx, times = [], [], []
+    prev = 0
+    for trip in trips:
+        trip_ids.append(trip['tripId'])
+        route_idx.append(routes.add(trip['routeId']))
+        start_times.append(trip['startTime'])
+        start_dates.append(trip['startDate'])
+        updates = trip['stopTimeUpdate']
+        counts.append(len(updates))
+        for stu in updates:
+            stop_idx.append(stops.add(stu['stopId']))
+            # Arrival and departure share one delta stream; None marks an absent field
+            for field in ('arrival', 'departure'):
+                event = stu[field]
+                if event is None:
+                    times.append(None)
+                else:
+                    times.append(event['time'] - prev)
+                    prev = event['time']
+
+    return _dumps({
+        "v": COMPACT_VERSION,
+        "updated": updated,
+        "stops": stops.values,
+        "routes": routes.values,
+        "trips": {
+            "tripId": trip_ids,
+            "route": route_idx,
+            "startTime": start_times,
+            "startDate": start_dates,
+            "count": counts,
+            "stop": stop_idx,
+            "time": times
+        }
+    })
+
+
+def decode_realtime(payload):
+    """Inverse of encode_realtime. Returns the regular {"updated", "trips"} structure."""
+    data = json.loads(payload)
+    stops, routes, cols = data["stops"], data["routes"], data["trips"]
+    trips = []
+    cursor, prev = 0, 0
+    for i, trip_id in enumerate(cols["tripId"]):
+        updates = []
+        for _ in range(cols["count"][i]):
+            events = []
+            for delta in cols["time"][2 * cursor:2 * cursor + 2]:
+                if delta is None:
+                    events.append(None)
+                else:
+                    prev += delta
+                    events.append({"time": prev})
+            updates.append({"stopId": stops[cols["stop"][cursor]], "arrival": events[0], "departure": events[1]})
+            cursor += 1
+
+        first = updates[0]
+        arrival = first["arrival"]["time"] if first["arrival"] else 0
+        departure = first["departure"]["time"] if first["departure"] else 0
+        trips.append({
+            "tripId": trip_id,
+            "routeId": routes[cols["route"][i]],
+            "startTime": cols["startTime"][i],
+            "startDate": cols["startDate"][i],
+            "stopId": first["stopId"],
+            "status": "STOPPED_AT" if not arrival else "IN_TRANSIT_TO",
+            "time": arrival or departure,
+            "stopTimeUpdate": updates
+        })
+    return {"updated": data["updated"], "trips": trips}
+
+
+# --- Schedule ---
+
+def encode_schedule(response):
+    """Encodes the filtered /api/schedule response ({routes, stops, meta})."""
+    stop_ids, services = _Dictionary(), _Dictionary()
+    routes = {}
+    for route_id, trips in response['routes'].items():
+        trip_ids, dirs, service_idx, counts, stop_idx, times = [], [], [], [], [], []
+        prev = 0
+        for trip in trips:
+            trip_ids.append(trip['tripId'])
+            dirs.append(trip['dir'])
+            service_idx.append(services.add(trip['serviceId']))
+            counts.append(len(trip['stops']))
+            for stop in trip['stops']:
+                stop_idx.append(stop_ids.add(stop['id']))
+                times.append(stop['time'] - prev)
+                prev = stop['time']
+        routes[route_id] = {
+            "tripId": trip_ids,
+            "dir": dirs,
+            "service": service_idx,
+            "count": counts,
+            "stop": stop_idx,
+            "time": times
+        }
+
+    return _dumps({
+        "v": COMPACT_VERSION,
+        "stopIds": stop_ids.values,
+        "services": services.values,
+        "routes": routes,
+        "stops": response['stops'],
+        "meta": response['meta']
+    })
+
+
+def decode_schedule(payload):
+    """Inverse of encode_schedule."""
+    data = json.loads(payload)
+    stop_ids, services = data["stopIds"], data["services"]
+    routes = {}
+    for route_id, cols in data["routes"].items():
+        trips = []
+        cursor, prev = 0, 0
+        for i, trip_id in enumerate(cols["tripId"]):
+            stops = []
+            for _ in range(cols["count"][i]):
+                prev += cols["time"][cursor]
+                stops.append({"id": stop_ids[cols["stop"][cursor]], "time": prev})
+                cursor += 1
+            trips.append({
+                "tripId": trip_id,
+                "dir": cols["dir"][i],
+                "serviceId": services[cols["service"][i]],
+                "stops": stops
+            })
+        routes[route_id] = trips
+    return {"routes": routes, "stops": data["stops"], "meta": data["meta"]}